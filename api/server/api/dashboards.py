@@ -1,14 +1,20 @@
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Response
 from pydantic import BaseModel, Field, constr
-from typing import List, Dict, Optional, Union
+from typing import List, Dict, Literal, Optional, Union
 from bson import ObjectId
+from pymongo import ReturnDocument
 from datetime import datetime
 
 from api.server.database.models import User, Dashboard, DashboardCreate, Chart
-from api.server.database.connection import get_dashboards_collection
+from api.server.database.connection import get_dashboards_collection, get_tenders_collection
 from api.server.auth.jwt_handler import get_current_user
 from api.server.utils.data_helpers import clean_filtres
+from api.server.stats.widgets import resolve_dashboard_data
+from api.server.exports import pdf as pdf_export
+from api.server.stats.cache import generation_token
+from api.server.utils.json_response import FastJSONResponse
+from api.server.utils.etag import make_etag, etag_matches, etag_headers, not_modified, conditional_json
 
 router = APIRouter(prefix="/dashboards", tags=["dashboards"])
 
@@ -22,30 +28,176 @@ class LayoutItem(BaseModel):
     w: int
     h: int
 
+# Opérations acceptées par /{dashboard_id}/ops, appliquées dans l'ordre
+MAX_DASHBOARD_OPS = 500
+# Réécritures tentées quand un autre écrivain passe entre la lecture et l'écriture
+OPS_WRITE_ATTEMPTS = 3
+
+class DashboardOp(BaseModel):
+    op: Literal["move", "resize", "retitle", "refilter", "retext", "add", "remove"]
+    instance_id: Optional[str] = None
+    x: Optional[int] = None
+    y: Optional[int] = None
+    w: Optional[int] = None
+    h: Optional[int] = None
+    customTitle: Optional[str] = None
+    filtres: Optional[Dict[str, Union[list, str]]] = None
+    text: Optional[str] = None
+    chart: Optional[Chart] = None
+
+class DashboardOps(BaseModel):
+    # version du tableau de bord sur laquelle le client a travaillé (409 si elle a changé)
+    version: Optional[int] = None
+    ops: List[DashboardOp] = Field(..., min_length=1, max_length=MAX_DASHBOARD_OPS)
+
+def dashboard_etag(doc) -> str:
+    """ETag d'un tableau de bord : toute modification incrémente version (date_maj peut se répéter)"""
+    return make_etag(str(doc["_id"]), doc.get("version", 0))
+
+# Champs renvoyés pour chaque graphique (ceux du modèle Chart)
+CHART_FIELDS = tuple(Chart.model_fields)
+
 def dashboard_from_mongo(doc):
-    """Convertit un document MongoDB en objet Dashboard"""
+    """Convertit un document MongoDB en dictionnaire de la forme du modèle Dashboard.
+
+    Conversion directe, sans construire d'objets Pydantic : les dates restent des
+    datetime, sérialisées par la réponse orjson.
+    """
     if not doc:
         return None
-    
-    # Nettoyer les filtres de chaque graphique
-    if "graphiques" in doc:
-        for graphique in doc["graphiques"]:
-            if "filtres" in graphique:
-                graphique["filtres"] = clean_filtres(graphique["filtres"])
-    
-    # Nettoyer les filtres globaux
-    if "filtres_globaux" in doc:
-        doc["filtres_globaux"] = clean_filtres(doc["filtres_globaux"])
-    
-    doc["_id"] = str(doc["_id"])
-    return Dashboard(**doc)
+
+    graphiques = []
+    for graphique in doc.get("graphiques") or []:
+        chart = {field: graphique.get(field) for field in CHART_FIELDS}
+        # Nettoyer les filtres de chaque graphique
+        chart["filtres"] = clean_filtres(graphique.get("filtres"))
+        graphiques.append(chart)
+
+    return {
+        "nom": doc.get("nom"),
+        "graphiques": graphiques,
+        # Nettoyer les filtres globaux
+        "filtres_globaux": clean_filtres(doc.get("filtres_globaux")),
+        "_id": str(doc["_id"]),
+        "user_id": doc.get("user_id"),
+        "date_creation": doc.get("date_creation"),
+        "date_maj": doc.get("date_maj"),
+        "version": doc.get("version", 0),
+    }
+
+async def mutate_dashboard(
+    db,
+    dashboard_id: str,
+    username: str,
+    update: Dict,
+    match: Optional[Dict] = None,
+    array_filters: Optional[List[Dict]] = None,
+    not_found: str = "Graphique non trouvé dans le tableau de bord"
+):
+    """Applique une modification atomique (un seul aller-retour) et renvoie le tableau de bord modifié.
+
+    `match` restreint la modification aux documents contenant le widget visé ; si rien ne
+    correspond, une seconde requête distingue un tableau de bord absent d'un widget absent.
+    """
+    query = {"_id": ObjectId(dashboard_id), "user_id": username}
+    update.setdefault("$set", {})["date_maj"] = datetime.utcnow()
+    # date_maj (précision BSON : 1 ms) peut être identique pour deux écritures ; version non
+    update.setdefault("$inc", {})["version"] = 1
+    doc = await db.find_one_and_update(
+        {**query, **(match or {})},
+        update,
+        array_filters=array_filters,
+        return_document=ReturnDocument.AFTER
+    )
+    if doc is None:
+        if match and await db.count_documents(query, limit=1):
+            raise HTTPException(status_code=404, detail=not_found)
+        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+    return FastJSONResponse(content=dashboard_from_mongo(doc), headers=etag_headers(dashboard_etag(doc)))
+
+# Champs requis et modifiés par chaque opération sur un widget existant
+WIDGET_OP_FIELDS = {
+    "move": ("x", "y"),
+    "resize": ("w", "h"),
+    "retitle": ("customTitle",),
+    "refilter": ("filtres",),
+    "retext": ("text",),
+}
+
+def apply_dashboard_ops(graphiques: List[Dict], ops: List[DashboardOp]) -> List[Dict]:
+    """Applique les opérations dans l'ordre sur une copie des graphiques.
+
+    Lève ValueError (opération invalide ou widget introuvable) sans rien modifier.
+    """
+    charts = [dict(chart) for chart in graphiques]
+    for index, op in enumerate(ops):
+        label = f"Opération {index} ({op.op})"
+        if op.op == "add":
+            if op.chart is None:
+                raise ValueError(f"{label}: chart requis")
+            chart = op.chart.dict()
+            # Un instance_id fourni permet de viser le widget dans les opérations suivantes
+            if not chart.get("instance_id") or any(c.get("instance_id") == chart["instance_id"] for c in charts):
+                chart["instance_id"] = str(uuid.uuid4())
+            chart["filtres"] = clean_filtres(chart.get("filtres", {}))
+            charts.append(chart)
+            continue
+
+        if not op.instance_id:
+            raise ValueError(f"{label}: instance_id requis")
+        position = next((i for i, c in enumerate(charts) if c.get("instance_id") == op.instance_id), None)
+        if position is None:
+            raise ValueError(f"{label}: widget {op.instance_id} introuvable")
+        if op.op == "remove":
+            del charts[position]
+            continue
+
+        fields = WIDGET_OP_FIELDS[op.op]
+        values = {field: getattr(op, field) for field in fields}
+        if any(value is None for value in values.values()):
+            raise ValueError(f"{label}: {', '.join(fields)} requis")
+        if op.op == "refilter":
+            values["filtres"] = clean_filtres(values["filtres"])
+        charts[position].update(values)
+    return charts
+
+def with_instance_ids(graphiques: List[Dict]) -> List[Dict]:
+    """Attribue un instance_id aux graphiques qui n'en ont pas ou dont l'instance_id est en double.
+
+    Les modifications ciblent les widgets par instance_id (arrayFilters, remove-chart, /ops).
+    """
+    seen = set()
+    charts = []
+    for chart in graphiques:
+        chart = dict(chart)
+        if not chart.get("instance_id") or chart["instance_id"] in seen:
+            chart["instance_id"] = str(uuid.uuid4())
+        seen.add(chart["instance_id"])
+        charts.append(chart)
+    return charts
+
+def widget_target(data: dict) -> tuple:
+    """Filtre du widget visé : instance_id s'il est fourni, sinon tous les widgets du chart_id"""
+    instance_id = data.get("instance_id")
+    if instance_id:
+        return "instance_id", instance_id
+    return "chart_id", data.get("chart_id")
 
 @router.get("/")
 async def list_dashboards(
     current_user: User = Depends(get_current_user), 
-    db=Depends(get_dashboards_collection)
+    db=Depends(get_dashboards_collection),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Lister les tableaux de bord de l'utilisateur connecté"""
+    # Version de la liste : (_id, version) de chaque tableau de bord, triés via l'index user_id/date_maj
+    versions = await db.find(
+        {"user_id": current_user.username}, {"version": 1}
+    ).sort("date_maj", -1).to_list(length=None)
+    etag = make_etag(current_user.username, [(str(v["_id"]), v.get("version", 0)) for v in versions])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
     dashboards = []
     cursor = db.find({"user_id": current_user.username})
     async for doc in cursor:
@@ -54,7 +206,7 @@ async def list_dashboards(
         except Exception as e:
             print(f"Erreur lors du traitement du dashboard {doc.get('_id')}: {e}")
             continue
-    return dashboards
+    return FastJSONResponse(content=dashboards, headers=etag_headers(etag))
 
 @router.post("/")
 async def create_dashboard(
@@ -64,13 +216,14 @@ async def create_dashboard(
 ):
     """Créer un nouveau tableau de bord personnalisé"""
     data = dashboard.dict()
+    data["graphiques"] = with_instance_ids(data["graphiques"])
     data["user_id"] = current_user.username
     data["date_creation"] = datetime.utcnow()
     data["date_maj"] = datetime.utcnow()
+    data["version"] = 1
     
     result = await db.insert_one(data)
-    data["_id"] = str(result.inserted_id)
-    return Dashboard(**data)
+    return FastJSONResponse(content=dashboard_from_mongo(data))
 
 @router.patch("/{dashboard_id}/rename")
 async def rename_dashboard(
@@ -80,15 +233,14 @@ async def rename_dashboard(
     db=Depends(get_dashboards_collection)
 ):
     """Renomme un tableau de bord"""
-    result = await db.update_one(
+    doc = await db.find_one_and_update(
         {"_id": ObjectId(dashboard_id), "user_id": current_user.username},
-        {"$set": {"nom": data.nom, "date_maj": datetime.utcnow()}}
+        {"$set": {"nom": data.nom, "date_maj": datetime.utcnow()}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.AFTER
     )
-    if result.matched_count == 0:
+    if doc is None:
         raise HTTPException(status_code=404, detail="Tableau de bord non trouvé ou vous n'avez pas la permission de le renommer.")
-    
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
+    return FastJSONResponse(content=dashboard_from_mongo(doc), headers=etag_headers(dashboard_etag(doc)))
 
 @router.patch("/{dashboard_id}")
 async def update_dashboard(
@@ -97,27 +249,12 @@ async def update_dashboard(
     current_user: User = Depends(get_current_user), 
     db=Depends(get_dashboards_collection)
 ):
-    """Modifier un tableau de bord"""
-    current_dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not current_dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    data = dashboard.dict(by_alias=True, exclude_unset=True, exclude={"id", "user_id"})
-    data["date_maj"] = datetime.utcnow()
-    
-    # Préserver les filtres_globaux existants
-    if "filtres_globaux" in current_dashboard:
-        data["filtres_globaux"] = current_dashboard["filtres_globaux"]
-    
-    result = await db.update_one(
-        {"_id": ObjectId(dashboard_id), "user_id": current_user.username}, 
-        {"$set": data}
-    )
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
+    """Modifier un tableau de bord (les filtres globaux existants sont préservés)"""
+    data = dashboard.dict(by_alias=True, exclude_unset=True, exclude={"id", "user_id", "filtres_globaux", "version"})
+    data.pop("_id", None)
+    if "graphiques" in data:
+        data["graphiques"] = with_instance_ids(data["graphiques"])
+    return await mutate_dashboard(db, dashboard_id, current_user.username, {"$set": data})
 
 @router.delete("/{dashboard_id}")
 async def delete_dashboard(
@@ -139,26 +276,10 @@ async def add_chart_to_dashboard(
     db=Depends(get_dashboards_collection)
 ):
     """Ajouter un graphique à un tableau de bord existant"""
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    charts = dashboard.get("graphiques", [])
     chart_data = chart.dict()
     chart_data['instance_id'] = str(uuid.uuid4())
     chart_data["filtres"] = clean_filtres(chart_data.get("filtres", {}))
-    charts.append(chart_data)
-    
-    update_data = {"graphiques": charts, "date_maj": datetime.utcnow()}
-    if "filtres_globaux" in dashboard:
-        update_data["filtres_globaux"] = dashboard["filtres_globaux"]
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)},
-        {"$set": update_data}
-    )
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(dashboard)
+    return await mutate_dashboard(db, dashboard_id, current_user.username, {"$push": {"graphiques": chart_data}})
 
 @router.delete("/{dashboard_id}/remove-chart/{instance_id}")
 async def remove_chart_from_dashboard(
@@ -168,44 +289,93 @@ async def remove_chart_from_dashboard(
     db=Depends(get_dashboards_collection)
 ):
     """Supprimer un graphique d'un tableau de bord"""
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    charts = dashboard.get("graphiques", [])
-    
-    # S'assurer que les anciens widgets ont un instance_id
-    for c in charts:
-        if 'instance_id' not in c or c['instance_id'] is None:
-            c['instance_id'] = str(uuid.uuid4())
-
-    new_charts = [c for c in charts if c.get("instance_id") != instance_id]
-    
-    if len(new_charts) == len(charts):
-        raise HTTPException(status_code=404, detail="Graphique non trouvé dans ce tableau de bord")
-    
-    update_data = {"graphiques": new_charts, "date_maj": datetime.utcnow()}
-    if "filtres_globaux" in dashboard:
-        update_data["filtres_globaux"] = dashboard["filtres_globaux"]
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)},
-        {"$set": update_data}
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username,
+        {"$pull": {"graphiques": {"instance_id": instance_id}}},
+        match={"graphiques.instance_id": instance_id},
+        not_found="Graphique non trouvé dans ce tableau de bord"
     )
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(dashboard)
 
 @router.get("/{dashboard_id}")
 async def get_dashboard(
     dashboard_id: str, 
     current_user: User = Depends(get_current_user), 
-    db=Depends(get_dashboards_collection)
+    db=Depends(get_dashboards_collection),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Récupérer un tableau de bord unique par son id"""
+    query = {"_id": ObjectId(dashboard_id), "user_id": current_user.username}
+    if if_none_match:
+        # Revalidation : seule version est lue
+        version = await db.find_one(query, {"version": 1})
+        if version and etag_matches(if_none_match, dashboard_etag(version)):
+            return not_modified(dashboard_etag(version))
+    doc = await db.find_one(query)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+    return FastJSONResponse(content=dashboard_from_mongo(doc), headers=etag_headers(dashboard_etag(doc)))
+
+@router.get("/{dashboard_id}/data")
+async def get_dashboard_data(
+    dashboard_id: str,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_dashboards_collection),
+    tenders=Depends(get_tenders_collection),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Données de tous les graphiques d'un tableau de bord en une seule requête"""
+    doc = await db.find_one(
+        {"_id": ObjectId(dashboard_id), "user_id": current_user.username},
+        {"graphiques": 1, "filtres_globaux": 1, "version": 1}
+    )
+    if not doc:
+        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+    etag = make_etag(dashboard_etag(doc), generation_token())
+    return await conditional_json(if_none_match, etag, lambda: resolve_dashboard_data(tenders, doc))
+
+@router.get("/{dashboard_id}/export/pdf")
+async def export_dashboard_pdf(
+    dashboard_id: str,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_dashboards_collection),
+    tenders=Depends(get_tenders_collection),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Rapport PDF d'un tableau de bord : chaque widget avec ses données calculées côté serveur"""
     doc = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
     if not doc:
         raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    return dashboard_from_mongo(doc)
+    version = generation_token()
+    etag = make_etag("pdf", dashboard_etag(doc), version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+
+    key = (str(doc["_id"]), doc.get("version", 0), version)
+    pdf = pdf_export.pdf_cache.get(key)
+    if pdf is None:
+        data = await resolve_dashboard_data(tenders, doc)
+        widgets = []
+        for widget, chart in zip(data["widgets"], doc.get("graphiques", [])):
+            widgets.append({
+                "titre": chart.get("customTitle") or chart.get("titre") or chart.get("chart_id"),
+                "filtres": widget["filtres"],
+                "text": chart.get("text"),
+                "data": widget["data"],
+                "error": widget.get("error"),
+            })
+        report = {
+            "nom": doc.get("nom") or "Tableau de bord",
+            "sous_titre": f"Généré le {datetime.utcnow():%d/%m/%Y à %H:%M} (UTC) pour {current_user.username}",
+            "widgets": widgets,
+        }
+        pdf = await pdf_export.render_cached(key, report)
+
+    filename = f"tableau_de_bord_{dashboard_id}.pdf"
+    return Response(
+        content=pdf,
+        media_type=pdf_export.PDF_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}", **etag_headers(etag)}
+    )
 
 @router.post("/{dashboard_id}/update-chart-filters")
 async def update_chart_filters(
@@ -220,26 +390,13 @@ async def update_chart_filters(
     if not chart_id or filtres is None:
         raise HTTPException(status_code=400, detail="chart_id et filtres requis")
     
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    charts = dashboard.get("graphiques", [])
-    updated = False
-    for c in charts:
-        if c.get("chart_id") == chart_id:
-            c["filtres"] = clean_filtres(filtres)
-            updated = True
-    
-    if not updated:
-        raise HTTPException(status_code=404, detail="Graphique non trouvé dans le tableau de bord")
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)}, 
-        {"$set": {"graphiques": charts, "date_maj": datetime.utcnow()}}
+    field, value = widget_target(data)
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username,
+        {"$set": {"graphiques.$[w].filtres": clean_filtres(filtres)}},
+        match={f"graphiques.{field}": value},
+        array_filters=[{f"w.{field}": value}]
     )
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
 
 @router.post("/{dashboard_id}/update-global-filters")
 async def update_global_filters(
@@ -253,19 +410,9 @@ async def update_global_filters(
     if filtres is None:
         raise HTTPException(status_code=400, detail="filtres requis")
     
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    filtres_globaux = clean_filtres(filtres)
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)},
-        {"$set": {"filtres_globaux": filtres_globaux, "date_maj": datetime.utcnow()}}
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username, {"$set": {"filtres_globaux": clean_filtres(filtres)}}
     )
-    
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
 
 @router.post("/{dashboard_id}/update-chart-title")
 async def update_chart_title(
@@ -280,26 +427,13 @@ async def update_chart_title(
     if not chart_id or custom_title is None:
         raise HTTPException(status_code=400, detail="chart_id et customTitle requis")
     
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    charts = dashboard.get("graphiques", [])
-    updated = False
-    for c in charts:
-        if c.get("chart_id") == chart_id:
-            c["customTitle"] = custom_title
-            updated = True
-    
-    if not updated:
-        raise HTTPException(status_code=404, detail="Graphique non trouvé dans le tableau de bord")
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)}, 
-        {"$set": {"graphiques": charts, "date_maj": datetime.utcnow()}}
+    field, value = widget_target(data)
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username,
+        {"$set": {"graphiques.$[w].customTitle": custom_title}},
+        match={f"graphiques.{field}": value},
+        array_filters=[{f"w.{field}": value}]
     )
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
 
 @router.post("/{dashboard_id}/update-chart-text")
 async def update_chart_text(
@@ -314,26 +448,14 @@ async def update_chart_text(
     if not chart_id or text is None:
         raise HTTPException(status_code=400, detail="chart_id et text requis")
     
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
-    
-    charts = dashboard.get("graphiques", [])
-    updated = False
-    for c in charts:
-        if c.get("chart_id") == chart_id:
-            c["text"] = text
-            updated = True
-    
-    if not updated:
-        raise HTTPException(status_code=404, detail="Widget section non trouvé dans le tableau de bord")
-    
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)}, 
-        {"$set": {"graphiques": charts, "date_maj": datetime.utcnow()}}
+    field, value = widget_target(data)
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username,
+        {"$set": {"graphiques.$[w].text": text}},
+        match={f"graphiques.{field}": value},
+        array_filters=[{f"w.{field}": value}],
+        not_found="Widget section non trouvé dans le tableau de bord"
     )
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc)
 
 @router.post("/{dashboard_id}/layout")
 async def update_dashboard_layout(
@@ -342,33 +464,67 @@ async def update_dashboard_layout(
     current_user: User = Depends(get_current_user),
     db=Depends(get_dashboards_collection)
 ):
-    """Met à jour la disposition des graphiques d'un tableau de bord"""
-    dashboard = await db.find_one({"_id": ObjectId(dashboard_id), "user_id": current_user.username})
-    if not dashboard:
-        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+    """Met à jour la disposition des graphiques d'un tableau de bord (widgets inconnus ignorés)"""
+    positions = {}
+    array_filters = []
+    # Un seul filtre par widget : deux chemins vers le même élément seraient en conflit
+    items = {item.instance_id: item for item in layout}
+    for index, item in enumerate(items.values()):
+        for key in ("x", "y", "w", "h"):
+            positions[f"graphiques.$[w{index}].{key}"] = getattr(item, key)
+        array_filters.append({f"w{index}.instance_id": item.instance_id})
+    return await mutate_dashboard(
+        db, dashboard_id, current_user.username,
+        {"$set": positions},
+        array_filters=array_filters or None
+    )
 
-    charts = dashboard.get("graphiques", [])
-    
-    # Assigner un instance_id aux anciens widgets qui n'en ont pas
-    for c in charts:
-        if 'instance_id' not in c or c['instance_id'] is None:
-            c['instance_id'] = str(uuid.uuid4())
+@router.post("/{dashboard_id}/ops")
+async def apply_dashboard_operations(
+    dashboard_id: str,
+    batch: DashboardOps,
+    current_user: User = Depends(get_current_user),
+    db=Depends(get_dashboards_collection)
+):
+    """Applique une suite d'opérations (move, resize, retitle, refilter, retext, add, remove) en une écriture.
 
-    charts_dict = {c['instance_id']: c for c in charts}
+    L'écriture est conditionnée à la version lue : si le tableau de bord a changé
+    depuis `version`, rien n'est écrit et la réponse 409 contient l'état courant.
+    """
+    query = {"_id": ObjectId(dashboard_id), "user_id": current_user.username}
 
-    for item in layout:
-        if item.instance_id in charts_dict:
-            charts_dict[item.instance_id]['x'] = item.x
-            charts_dict[item.instance_id]['y'] = item.y
-            charts_dict[item.instance_id]['w'] = item.w
-            charts_dict[item.instance_id]['h'] = item.h
+    for _ in range(OPS_WRITE_ATTEMPTS):
+        doc = await db.find_one(query, {"graphiques": 1, "version": 1})
+        if not doc:
+            raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+        current = doc.get("version", 0)
+        if batch.version is not None and current != batch.version:
+            break
+        try:
+            graphiques = apply_dashboard_ops(doc.get("graphiques") or [], batch.ops)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-    updated_charts = list(charts_dict.values())
+        # Compare-and-set sur version : échoue si un autre écrivain est passé entre-temps
+        # (version absente des tableaux de bord jamais modifiés depuis son ajout : 0)
+        updated = await db.find_one_and_update(
+            {**query, "version": current if current else {"$in": [0, None]}},
+            {"$set": {"graphiques": graphiques, "date_maj": datetime.utcnow()}, "$inc": {"version": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if updated is not None:
+            return FastJSONResponse(content=dashboard_from_mongo(updated), headers=etag_headers(dashboard_etag(updated)))
+        if batch.version is not None:
+            break
 
-    await db.update_one(
-        {"_id": ObjectId(dashboard_id)},
-        {"$set": {"graphiques": updated_charts, "date_maj": datetime.utcnow()}}
+    latest = await db.find_one(query)
+    if not latest:
+        raise HTTPException(status_code=404, detail="Tableau de bord non trouvé")
+    return FastJSONResponse(
+        status_code=409,
+        content={
+            "detail": "Le tableau de bord a été modifié entre-temps ; opérations non appliquées",
+            "dashboard": dashboard_from_mongo(latest),
+        },
+        headers=etag_headers(dashboard_etag(latest))
     )
-
-    doc = await db.find_one({"_id": ObjectId(dashboard_id)})
-    return dashboard_from_mongo(doc) 
\ No newline at end of file
@@ -0,0 +1,114 @@
+import os
+import re
+from typing import Optional, Tuple
+
+from fastapi import APIRouter, Depends, HTTPException, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from api.server.database.models import User
+from api.server.auth.jwt_handler import get_current_user
+from api.server.exports.jobs import export_jobs, DONE
+from api.server.utils.json_response import FastJSONResponse
+from api.server.utils.etag import make_etag, etag_matches
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Taille des morceaux lus sur disque pour le téléchargement
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def get_owned_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Dépendance : travail de l'utilisateur connecté (404 sinon, y compris s'il a expiré)"""
+    job = export_jobs.get(job_id, current_user.username)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export non trouvé ou expiré")
+    return job
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Plage d'octets demandée (bornes incluses), ou None si l'en-tête est ignoré.
+
+    Une seule plage est servie ; plusieurs plages, ou un fichier vide, renvoient le
+    fichier complet. Lève HTTPException 416 si la plage est hors du fichier.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or size == 0:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N : les N derniers octets
+        length = int(end)
+        if length == 0:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        return max(size - length, 0), size - 1
+    first = int(start)
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size or first > last:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return first, last
+
+async def iter_file(path: str, start: int, length: int):
+    handle = await run_in_threadpool(open, path, "rb")
+    try:
+        await run_in_threadpool(handle.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await run_in_threadpool(handle.read, min(DOWNLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(handle.close)
+
+@router.get("/{job_id}")
+async def get_job(job=Depends(get_owned_job)):
+    """État et progression d'un export en arrière-plan"""
+    return FastJSONResponse(content=job.to_dict())
+
+@router.get("/{job_id}/download")
+async def download_job(
+    job=Depends(get_owned_job),
+    range_header: Optional[str] = Header(None, alias="Range"),
+    if_range: Optional[str] = Header(None)
+):
+    """Télécharge le fichier d'un export terminé ; l'en-tête Range permet de reprendre un téléchargement"""
+    if job.status != DONE:
+        raise HTTPException(status_code=409, detail=f"Export non disponible (statut: {job.status})")
+    try:
+        size = (await run_in_threadpool(os.stat, job.path)).st_size
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Export non trouvé ou expiré")
+
+    etag = make_etag(job.id, size)
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={job.filename}",
+    }
+    requested = None
+    # If-Range : la plage n'est servie que si le fichier n'a pas changé entre-temps
+    if range_header and (if_range is None or etag_matches(if_range, etag)):
+        requested = parse_range(range_header, size)
+
+    if requested is None:
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(iter_file(job.path, 0, size), media_type=job.media_type, headers=headers)
+
+    start, end = requested
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        iter_file(job.path, start, end - start + 1),
+        status_code=206,
+        media_type=job.media_type,
+        headers=headers
+    )
+
+@router.delete("/{job_id}")
+async def delete_job(job=Depends(get_owned_job)):
+    """Annule un export en cours ou supprime le fichier d'un export terminé"""
+    await export_jobs.cancel(job)
+    return {"message": "Export supprimé"}
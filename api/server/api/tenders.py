@@ -1,21 +1,78 @@
-from fastapi import APIRouter, Query, Depends, HTTPException, Body
+from fastapi import APIRouter, Query, Depends, HTTPException, Body, Header, UploadFile, File
 from typing import Optional, List
 from datetime import datetime
-from fastapi.responses import JSONResponse, StreamingResponse
-import pandas as pd
-import io
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import re
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure, DuplicateKeyError
 
-from api.server.database.models import User, Tender, TenderCreate
+from api.server.database.models import User, Tender, TenderCreate, TenderUpdate, PaginatedResponse
 from api.server.database.connection import get_tenders_collection
+from api.server.database.indexes import NATURAL_KEY_INDEX
 from api.server.auth.jwt_handler import get_current_user
-from api.server.utils.data_helpers import patch_objectid, serialize_doc
+from api.server.utils.prefix_index import tender_name_index
+from api.server.utils.tender_fields import prepare_tender, prepare_tender_patch, write_operators, after_write
+from api.server.stats.rollup import apply_tender_write
+from api.server.stats.pipelines import STAT_NAMES, EVOLUTION_GRANULARITIES
+from api.server.stats.service import StatsFilters, compute_stat, compute_stats, compute_evolution
+from api.server.stats.cache import generation_token
+from api.server.exports import arrow as arrow_export
+from api.server.exports import xlsx as xlsx_export
+from api.server.exports.jobs import export_jobs, AdmissionError
+from api.server.imports.bulk import import_tenders
+from api.server.imports.readers import IMPORT_FORMATS, detect_format
+from api.server.utils.json_response import FastJSONResponse, raw_collection, decode_raw, decode_raw_all
+from api.server.utils.etag import make_etag, etag_matches, etag_headers, not_modified, conditional_json
+from api.server.stats.distribution import DISTRIBUTION_FIELDS, GROUP_BY_FIELDS, compute_distribution
+from api.server.utils.data_helpers import (
+    serialize_doc,
+    build_query_filters,
+    build_keyset_filter,
+    encode_cursor,
+    decode_cursor,
+    wants_ndjson,
+    iter_ndjson,
+    build_projection,
+    NDJSON_MEDIA_TYPE,
+    LIST_PROJECTION,
+    TENDER_FIELDS
+)
 
 router = APIRouter(prefix="/tenders", tags=["tenders"])
 
+# Pagination par curseur (keyset) sur (date_emission, _id)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+TENDER_SORT = [("date_emission", -1), ("_id", -1)]
+# Taille des lots lus depuis Mongo en mode flux NDJSON
+STREAM_BATCH_SIZE = 500
+# Projection par défaut de la recherche rapide
+SEARCH_PROJECTION = {"nom_ao": 1}
+# Modification partielle : champs qui ne peuvent pas être vidés, relectures en cas de conflit
+REQUIRED_TENDER_FIELDS = [name for name, info in TenderCreate.model_fields.items() if info.is_required()]
+PATCH_MAX_ATTEMPTS = 3
+# Violation de l'index unique (nom_ao, date_emission)
+DUPLICATE_TENDER_DETAIL = "Un appel d'offres avec ce nom et cette date d'émission existe déjà"
+
+def parse_fields(fields: Optional[str], default=None, required=()):
+    """Valide le paramètre `fields` et renvoie la projection MongoDB correspondante"""
+    try:
+        return build_projection(fields, default, required)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def stats_filters(
+    categorie: Optional[List[str]] = Query(None),
+    statut: Optional[List[str]] = Query(None),
+    pole: Optional[List[str]] = Query(None),
+    date_debut: Optional[str] = None,
+    date_fin: Optional[str] = None
+) -> StatsFilters:
+    """Dépendance : filtres communs des statistiques (paramètre répété pour plusieurs valeurs)"""
+    return StatsFilters(categorie, statut, pole, date_debut, date_fin).normalized()
+
 @router.get("/")
 async def get_tenders(
     categorie: Optional[str] = None,
@@ -23,361 +80,232 @@ async def get_tenders(
     pole: Optional[str] = None,
     date_debut: Optional[str] = None,
     date_fin: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    with_total: bool = False,
+    fields: Optional[str] = None,
+    accept: Optional[str] = Header(None),
     db=Depends(get_tenders_collection),
     current_user: User = Depends(get_current_user)
 ):
-    """Récupère la liste des appels d'offres avec filtres"""
-    query = {}
-    if categorie:
-        query["categorie"] = categorie
-    if statut:
-        query["statut"] = statut
-    if pole:
-        query["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        query["date_emission"] = date_query
-    
-    docs = await db.find(query).to_list(length=1000)
-    docs = [serialize_doc(doc) for doc in docs]
-    return JSONResponse(content=patch_objectid(docs))
+    """Récupère une page d'appels d'offres avec filtres (pagination par curseur).
+
+    Avec `Accept: application/x-ndjson`, tous les documents suivant le curseur
+    sont envoyés en flux (sans limite sauf si `limit` est fourni). Sans `fields`,
+    les champs texte volumineux sont exclus.
+    """
+    # date_emission est la clé de tri, nécessaire pour construire le curseur suivant
+    projection = parse_fields(fields, LIST_PROJECTION, required=("date_emission",))
+    query = build_query_filters(categorie, statut, pole, date_debut, date_fin)
+    page_query = query
+    if after:
+        try:
+            last_date, last_id = decode_cursor(after)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Curseur de pagination invalide")
+        keyset = build_keyset_filter(last_date, last_id)
+        page_query = {"$and": [query, keyset]} if query else keyset
+
+    # Documents bruts : décodés en un seul appel, sans conversion Python intermédiaire
+    raw = raw_collection(db)
+    if wants_ndjson(accept):
+        cursor = raw.find(page_query, projection).sort(TENDER_SORT).batch_size(STREAM_BATCH_SIZE)
+        if limit:
+            cursor = cursor.limit(limit)
+        return StreamingResponse(iter_ndjson(cursor), media_type=NDJSON_MEDIA_TYPE)
+
+    limit = min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    # On lit un document de plus pour savoir s'il existe une page suivante
+    cursor = raw.find(page_query, projection).sort(TENDER_SORT).limit(limit + 1)
+    docs = await cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1].get("date_emission"), docs[-1]["_id"])
+
+    total = await db.count_documents(query) if with_total else None
+    # Même forme que PaginatedResponse, sans validation des documents par Pydantic
+    return FastJSONResponse(content={
+        "items": decode_raw_all(docs),
+        "size": len(docs),
+        "next_cursor": next_cursor,
+        "total": total,
+        "page": None,
+        "pages": None
+    })
+
+def stats_etag(*parts) -> str:
+    """ETag d'une statistique : version des données du processus et paramètres normalisés"""
+    return make_etag(generation_token(), *parts)
 
 @router.get("/stats/win-loss")
 async def get_stats_win_loss(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Statistiques gagné/perdu"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": "$statut",
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"count": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("win-loss", filters), lambda: compute_stat(db, "win-loss", filters)
+    )
 
 @router.get("/stats/win-loss-evolution-month")
 async def get_stats_win_loss_evolution_month(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Évolution du taux de succès par mois"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$addFields": {
-                "mois": {"$substr": ["$date_emission", 0, 7]},
-                "annee": {"$substr": ["$date_emission", 0, 4]},
-                "mois_num": {"$substr": ["$date_emission", 5, 2]}
-            }
-        },
-        {
-            "$group": {
-                "_id": {
-                    "mois": "$mois",
-                    "annee": "$annee",
-                    "mois_num": "$mois_num",
-                    "statut": "$statut"
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"_id.annee": 1, "_id.mois_num": 1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("win-loss-evolution-month", filters), lambda: compute_stat(db, "win-loss-evolution-month", filters)
+    )
+
+UTC_OFFSET_RE = re.compile(r"^[+-]\d{2}(:?\d{2})?$")
+
+@router.get("/stats/win-loss-evolution")
+async def get_stats_win_loss_evolution(
+    granularity: str = Query("month", description=f"Période: {', '.join(EVOLUTION_GRANULARITIES)}"),
+    timezone: str = Query("UTC", description="Fuseau horaire (ex: Europe/Paris) ou décalage (+02:00)"),
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Évolution gagné/perdu par jour, semaine, mois, trimestre ou année"""
+    if granularity not in EVOLUTION_GRANULARITIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Granularité inconnue: {granularity}. Disponibles: {', '.join(EVOLUTION_GRANULARITIES)}"
+        )
+    if not UTC_OFFSET_RE.match(timezone):
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Fuseau horaire inconnu: {timezone}")
+    etag = stats_etag("win-loss-evolution", granularity, timezone, filters)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    try:
+        rows = await compute_evolution(db, filters, granularity, timezone)
+    except OperationFailure as e:
+        raise HTTPException(status_code=400, detail=f"Agrégation impossible: {e}")
+    return FastJSONResponse(content=rows, headers=etag_headers(etag))
 
 @router.get("/stats/success-rate-by-category")
 async def get_stats_success_rate_by_category(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Taux de succès par catégorie"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": {
-                    "categorie": "$categorie",
-                    "statut": "$statut"
-                },
-                "count": {"$sum": 1}
-            }
-        },
-        {
-            "$group": {
-                "_id": "$_id.categorie",
-                "total": {"$sum": "$count"},
-                "gagne": {
-                    "$sum": {
-                        "$cond": [
-                            {"$eq": ["$_id.statut", "Gagné"]},
-                            "$count",
-                            0
-                        ]
-                    }
-                }
-            }
-        },
-        {
-            "$addFields": {
-                "taux_succes": {
-                    "$multiply": [
-                        {"$divide": ["$gagne", "$total"]},
-                        100
-                    ]
-                }
-            }
-        },
-        {"$sort": {"taux_succes": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("success-rate-by-category", filters), lambda: compute_stat(db, "success-rate-by-category", filters)
+    )
 
 @router.get("/stats/delays")
 async def get_stats_delays(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Statistiques des délais"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": "$categorie",
-                "delai_moyen": {"$avg": "$delai_jours"},
-                "delai_min": {"$min": "$delai_jours"},
-                "delai_max": {"$max": "$delai_jours"},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"delai_moyen": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("delays", filters), lambda: compute_stat(db, "delays", filters)
+    )
 
 @router.get("/stats/scores")
 async def get_stats_scores(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Statistiques des notes techniques"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": "$categorie",
-                "note_moyenne": {"$avg": "$note_technique"},
-                "note_min": {"$min": "$note_technique"},
-                "note_max": {"$max": "$note_technique"},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"note_moyenne": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("scores", filters), lambda: compute_stat(db, "scores", filters)
+    )
 
 @router.get("/stats/pricing")
 async def get_stats_pricing(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Statistiques des prix"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": "$categorie",
-                "prix_moyen": {"$avg": "$prix_client"},
-                "prix_min": {"$min": "$prix_client"},
-                "prix_max": {"$max": "$prix_client"},
-                "ecart_prix_moyen": {"$avg": "$ecart_prix"},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"prix_moyen": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("pricing", filters), lambda: compute_stat(db, "pricing", filters)
+    )
 
 @router.get("/stats/comparison")
 async def get_stats_comparison(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Statistiques pour comparaison avec gagnant"""
-    match_stage = {}
-    if categorie:
-        match_stage["categorie"] = categorie
-    if statut:
-        match_stage["statut"] = statut
-    if pole:
-        match_stage["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        match_stage["date_emission"] = date_query
-
-    pipeline = [
-        {"$match": match_stage} if match_stage else {"$match": {}},
-        {
-            "$group": {
-                "_id": "$categorie",
-                "ecart_score_moyen": {"$avg": "$ecart_score"},
-                "ecart_score_min": {"$min": "$ecart_score"},
-                "ecart_score_max": {"$max": "$ecart_score"},
-                "count": {"$sum": 1}
-            }
-        },
-        {"$sort": {"ecart_score_moyen": -1}}
-    ]
-    
-    result = await db.aggregate(pipeline).to_list(length=100)
-    return JSONResponse(content=patch_objectid(result))
+    return await conditional_json(
+        if_none_match, stats_etag("comparison", filters), lambda: compute_stat(db, "comparison", filters)
+    )
+
+@router.get("/stats/bundle")
+async def get_stats_bundle(
+    include: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Plusieurs statistiques en une seule agrégation ($facet) et un seul aller-retour.
+
+    `include` liste les statistiques voulues (séparées par des virgules), toutes par défaut.
+    """
+    names = [name.strip() for name in include.split(",") if name.strip()] if include else list(STAT_NAMES)
+    unknown = [name for name in names if name not in STAT_NAMES]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Statistiques inconnues: {', '.join(unknown)}. Disponibles: {', '.join(STAT_NAMES)}"
+        )
+    names = list(dict.fromkeys(names))
+    return await conditional_json(
+        if_none_match, stats_etag("bundle", tuple(names), filters), lambda: compute_stats(db, names, filters)
+    )
+
+@router.get("/stats/distribution")
+async def get_stats_distribution(
+    field: str = Query(..., description=f"Champ numérique parmi: {', '.join(DISTRIBUTION_FIELDS)}"),
+    bins: int = Query(20, ge=1, le=200),
+    quantiles: Optional[str] = Query(None, description="Quantiles supplémentaires, ex: 0.1,0.9"),
+    group_by: Optional[str] = Query(None, description=f"Dimension parmi: {', '.join(GROUP_BY_FIELDS)}"),
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None)
+):
+    """Distribution d'un champ (quartiles, moustaches, valeurs aberrantes, histogramme) calculée côté serveur"""
+    if field not in DISTRIBUTION_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Champ non numérique ou inconnu: {field}")
+    if group_by and group_by not in GROUP_BY_FIELDS:
+        raise HTTPException(status_code=400, detail=f"Dimension inconnue: {group_by}")
+    try:
+        levels = [float(q) for q in quantiles.split(",") if q.strip()] if quantiles else []
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Quantiles invalides")
+    if any(not 0 <= q <= 1 for q in levels):
+        raise HTTPException(status_code=400, detail="Les quantiles doivent être compris entre 0 et 1")
+
+    return await conditional_json(
+        if_none_match,
+        stats_etag("distribution", field, bins, tuple(levels), group_by, filters),
+        lambda: compute_distribution(db, field, filters, bins, levels, group_by)
+    )
 
 @router.get("/filters/options")
 async def get_filters_options(
@@ -389,89 +317,323 @@ async def get_filters_options(
     statuts = await db.distinct("statut")
     poles = await db.distinct("pole")
     
-    return JSONResponse(content={
+    return FastJSONResponse(content={
         "categories": categories,
         "statuts": statuts,
         "poles": poles
     })
 
+async def _columnar_export(fmt: str, filters: StatsFilters, fields: Optional[str], db):
+    if not arrow_export.available():
+        raise HTTPException(status_code=501, detail="Export indisponible : pyarrow n'est pas installé")
+    projection = parse_fields(fields)
+    schema = arrow_export.export_schema(projection)
+    cursor = db.find(filters.to_match(), projection).batch_size(arrow_export.EXPORT_BATCH_ROWS)
+    extension, media_type = {
+        "parquet": ("parquet", arrow_export.PARQUET_MEDIA_TYPE),
+        "arrow": ("arrow", arrow_export.ARROW_MEDIA_TYPE),
+    }[fmt]
+    return StreamingResponse(
+        arrow_export.iter_columnar_export(cursor, fmt, schema),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=appels_offres.{extension}"}
+    )
+
+@router.get("/export/parquet")
+async def export_tenders_parquet(
+    fields: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Export Parquet (colonnes typées, compression zstd) de tous les appels d'offres filtrés"""
+    return await _columnar_export("parquet", filters, fields, db)
+
+@router.get("/export/arrow")
+async def export_tenders_arrow(
+    fields: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Export Arrow IPC (format flux) de tous les appels d'offres filtrés"""
+    return await _columnar_export("arrow", filters, fields, db)
+
 @router.get("/export/excel")
 async def export_tenders_excel(
-    categorie: Optional[str] = None,
-    statut: Optional[str] = None,
-    pole: Optional[str] = None,
-    date_debut: Optional[str] = None,
-    date_fin: Optional[str] = None,
+    fields: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
     db=Depends(get_tenders_collection),
     current_user: User = Depends(get_current_user)
 ):
-    """Export Excel des appels d'offres"""
-    query = {}
-    if categorie:
-        query["categorie"] = categorie
-    if statut:
-        query["statut"] = statut
-    if pole:
-        query["pole"] = pole
-    if date_debut or date_fin:
-        date_query = {}
-        if date_debut:
-            date_query["$gte"] = date_debut
-        if date_fin:
-            date_query["$lte"] = date_fin
-        query["date_emission"] = date_query
-    
-    docs = await db.find(query).to_list(length=1000)
-    if not docs:
+    """Export Excel des appels d'offres, envoyé en flux sans limite de lignes"""
+    projection = parse_fields(fields)
+    columns = ["_id"] + [f for f in TENDER_FIELDS if not projection or f in projection]
+    cursor = db.find(filters.to_match(), projection).batch_size(xlsx_export.EXPORT_BATCH_ROWS)
+    first_batch = await cursor.to_list(length=xlsx_export.EXPORT_BATCH_ROWS)
+    if not first_batch:
         raise HTTPException(status_code=404, detail="Aucun appel d'offres trouvé pour l'export")
-    
-    # Nettoyage et conversion
-    for doc in docs:
-        doc["_id"] = str(doc["_id"])
-    
-    df = pd.DataFrame(docs)
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine="openpyxl") as writer:
-        df.to_excel(writer, index=False, sheet_name="AppelsOffres")
-    output.seek(0)
-    
+
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        xlsx_export.iter_xlsx_export(cursor, columns, first_batch),
+        media_type=xlsx_export.XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": "attachment; filename=appels_offres.xlsx"}
     )
 
+EXPORT_JOB_FORMATS = ("xlsx", "parquet", "arrow")
+
+@router.post("/export/jobs", status_code=202)
+async def create_export_job(
+    format: str = Query("xlsx"),
+    fields: Optional[str] = None,
+    filters: StatsFilters = Depends(stats_filters),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Lance un export en arrière-plan ; suivre `/jobs/{id}` puis télécharger `/jobs/{id}/download`"""
+    if format not in EXPORT_JOB_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format inconnu: {format}. Formats disponibles: {', '.join(EXPORT_JOB_FORMATS)}"
+        )
+    if format != "xlsx" and not arrow_export.available():
+        raise HTTPException(status_code=501, detail="Export indisponible : pyarrow n'est pas installé")
+    projection = parse_fields(fields)
+    match = filters.to_match()
+
+    if format == "xlsx":
+        columns = ["_id"] + [f for f in TENDER_FIELDS if not projection or f in projection]
+        batch_size = xlsx_export.EXPORT_BATCH_ROWS
+        media_type = xlsx_export.XLSX_MEDIA_TYPE
+
+        def produce(cursor):
+            return xlsx_export.iter_xlsx_export(cursor, columns)
+    else:
+        schema = arrow_export.export_schema(projection)
+        batch_size = arrow_export.EXPORT_BATCH_ROWS
+        media_type = arrow_export.PARQUET_MEDIA_TYPE if format == "parquet" else arrow_export.ARROW_MEDIA_TYPE
+
+        def produce(cursor):
+            return arrow_export.iter_columnar_export(cursor, format, schema)
+
+    total = await db.count_documents(match)
+    try:
+        job = export_jobs.submit(
+            owner=current_user.username,
+            fmt=format,
+            filename=f"appels_offres.{format}",
+            media_type=media_type,
+            total=total,
+            open_cursor=lambda: db.find(match, projection).batch_size(batch_size),
+            produce=produce
+        )
+    except AdmissionError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return FastJSONResponse(
+        status_code=202,
+        content=job.to_dict(),
+        headers={"Location": f"/api/jobs/{job.id}"}
+    )
+
 @router.get("/search")
 async def search_tenders(
     q: str = Query(None),
+    mode: str = Query("quick", pattern="^(quick|text)$"),
+    categorie: Optional[str] = None,
+    statut: Optional[str] = None,
+    pole: Optional[str] = None,
+    date_debut: Optional[str] = None,
+    date_fin: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    size: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
     db=Depends(get_tenders_collection),
     current_user: User = Depends(get_current_user)
 ):
-    """Recherche d'appels d'offres"""
+    """Recherche d'appels d'offres.
+
+    `mode=quick` renvoie les 10 premiers noms correspondants (saisie semi-automatique,
+    servie par l'index de préfixes en mémoire dès qu'il est construit) ;
+    `mode=text` interroge l'index plein texte (nom, commentaires IA, raison de perte),
+    trie par pertinence et pagine avec les mêmes filtres que la liste.
+    """
+    if mode == "text":
+        projection = parse_fields(fields, LIST_PROJECTION)
+        if not q or not q.strip():
+            return FastJSONResponse(content=PaginatedResponse(items=[], size=0, total=0, page=page, pages=0).dict())
+        return await full_text_search(
+            db, q, build_query_filters(categorie, statut, pole, date_debut, date_fin), projection, page, size
+        )
+
+    projection = parse_fields(fields, SEARCH_PROJECTION)
     if not q or len(q) < 2:
         return []
+
+    # Réponse depuis l'index en mémoire, sans interroger MongoDB
+    if tender_name_index.ready and fields is None:
+        return tender_name_index.search(q, limit=10)
     
-    cursor = db.find({"nom_ao": {"$regex": q, "$options": "i"}}).limit(10)
+    cursor = db.find({"nom_ao": {"$regex": q, "$options": "i"}}, projection).limit(10)
     results = []
     async for doc in cursor:
-        results.append({"_id": str(doc["_id"]), "nom_ao": doc["nom_ao"]})
+        results.append(serialize_doc(doc))
     return results
 
+async def full_text_search(db, q: str, filters: dict, projection: Optional[dict], page: int, size: int):
+    """Recherche plein texte classée par score (index tenders_text_fr)"""
+    query = {**filters, "$text": {"$search": q, "$language": "french"}}
+    projection = dict(projection or {})
+    projection["score"] = {"$meta": "textScore"}
+
+    cursor = (
+        db.find(query, projection)
+        .sort([("score", {"$meta": "textScore"}), ("_id", -1)])
+        .skip((page - 1) * size)
+        .limit(size)
+    )
+    docs = [serialize_doc(doc) async for doc in cursor]
+    total = await db.count_documents(query)
+    result = PaginatedResponse(
+        items=docs,
+        size=len(docs),
+        total=total,
+        page=page,
+        pages=(total + size - 1) // size
+    )
+    return FastJSONResponse(content=result.dict())
+
 @router.get("/{tender_id}")
 async def get_tender_detail(
     tender_id: str,
+    fields: Optional[str] = None,
     db=Depends(get_tenders_collection),
     current_user: User = Depends(get_current_user)
 ):
     """Récupère les détails d'un appel d'offres"""
+    projection = parse_fields(fields)
     try:
-        doc = await db.find_one({"_id": ObjectId(tender_id)})
+        doc = await raw_collection(db).find_one({"_id": ObjectId(tender_id)}, projection)
         if not doc:
             raise HTTPException(status_code=404, detail="Appel d'offres non trouvé")
-        return JSONResponse(content=serialize_doc(doc))
+        return FastJSONResponse(content=decode_raw(doc))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur lors de la récupération: {e}")
 
+@router.post("/")
+async def create_tender(
+    tender: TenderCreate,
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Crée un appel d'offres (champs dérivés et dates typées calculés à l'écriture)"""
+    now = datetime.utcnow()
+    # Insertion : aucun ancien champ dérivé à supprimer
+    doc, _ = prepare_tender(tender.dict(), now)
+    doc["date_creation"] = now
+    try:
+        result = await db.insert_one(doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=DUPLICATE_TENDER_DETAIL)
+    doc["_id"] = result.inserted_id
+    await apply_tender_write(db.database, None, doc)
+    return FastJSONResponse(status_code=201, content=serialize_doc(dict(doc)))
+
+@router.post("/bulk")
+async def bulk_import_tenders(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv, xlsx ou ndjson (déduit du nom de fichier sinon)"),
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Importe en masse des appels d'offres (CSV, Excel ou NDJSON).
+
+    Les lignes sont validées par lots ; une ligne existante (même nom_ao et date_emission)
+    est mise à jour. Le rapport liste les lignes rejetées et leurs erreurs.
+    """
+    fmt = format or detect_format(file.filename, file.content_type)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Format d'import non reconnu. Formats disponibles: {', '.join(IMPORT_FORMATS)}"
+        )
+    # Sans l'index unique, des upserts concurrents pourraient dupliquer des appels d'offres
+    if NATURAL_KEY_INDEX not in await db.index_information():
+        await file.close()
+        raise HTTPException(
+            status_code=503,
+            detail=f"Import en masse indisponible : index {NATURAL_KEY_INDEX} absent "
+                   "(doublons nom_ao/date_emission à corriger, cf. /health/indexes)"
+        )
+    try:
+        report = await import_tenders(db, file.file, fmt)
+    finally:
+        await file.close()
+    return FastJSONResponse(content=report.to_dict())
+
+@router.put("/{tender_id}")
+async def update_tender(
+    tender_id: str,
+    tender: TenderCreate,
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Remplace les champs d'un appel d'offres et recalcule ses champs dérivés"""
+    if not ObjectId.is_valid(tender_id):
+        raise HTTPException(status_code=400, detail="Identifiant invalide")
+    update, unset = prepare_tender(tender.dict())
+    try:
+        before = await db.find_one_and_update(
+            {"_id": ObjectId(tender_id)},
+            write_operators(update, unset),
+            return_document=ReturnDocument.BEFORE
+        )
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail=DUPLICATE_TENDER_DETAIL)
+    if not before:
+        raise HTTPException(status_code=404, detail="Appel d'offres non trouvé")
+    after = after_write(before, update, unset)
+    await apply_tender_write(db.database, before, after)
+    return FastJSONResponse(content=serialize_doc(dict(after)))
+
+@router.patch("/{tender_id}")
+async def patch_tender(
+    tender_id: str,
+    changes: TenderUpdate,
+    db=Depends(get_tenders_collection),
+    current_user: User = Depends(get_current_user)
+):
+    """Modifie les seuls champs envoyés d'un appel d'offres.
+
+    Les champs dérivés sont recalculés sur le document lu ; l'écriture n'a lieu que si
+    date_maj n'a pas changé entre-temps (nouvelle lecture sinon).
+    """
+    if not ObjectId.is_valid(tender_id):
+        raise HTTPException(status_code=400, detail="Identifiant invalide")
+    fields = changes.dict(exclude_unset=True)
+    cleared = [field for field in REQUIRED_TENDER_FIELDS if field in fields and fields[field] is None]
+    if cleared:
+        raise HTTPException(status_code=400, detail=f"Champs obligatoires: {', '.join(cleared)}")
+
+    for _ in range(PATCH_MAX_ATTEMPTS):
+        before = await db.find_one({"_id": ObjectId(tender_id)})
+        if not before:
+            raise HTTPException(status_code=404, detail="Appel d'offres non trouvé")
+        if not fields:
+            return FastJSONResponse(content=serialize_doc(dict(before)))
+        update, unset = prepare_tender_patch(before, fields)
+        try:
+            result = await db.update_one(
+                {"_id": before["_id"], "date_maj": before.get("date_maj")},
+                write_operators(update, unset)
+            )
+        except DuplicateKeyError:
+            raise HTTPException(status_code=409, detail=DUPLICATE_TENDER_DETAIL)
+        if result.matched_count:
+            after = after_write(before, update, unset)
+            await apply_tender_write(db.database, before, after)
+            return FastJSONResponse(content=serialize_doc(dict(after)))
+    raise HTTPException(status_code=409, detail="Appel d'offres modifié simultanément, réessayez")
+
 @router.post("/favorites/{tender_id}")
 async def add_tender_favorite(
     tender_id: str,
@@ -481,16 +643,14 @@ async def add_tender_favorite(
     """Ajouter un appel d'offres aux favoris"""
     try:
         favorites_collection = db.database['tender_favorites']
-        # Vérifie si déjà favori
-        exists = await favorites_collection.find_one({"user_id": current_user.username, "tender_id": tender_id})
-        if exists:
+        # L'index unique (user_id, tender_id) permet un upsert en un seul aller-retour
+        result = await favorites_collection.update_one(
+            {"user_id": current_user.username, "tender_id": tender_id},
+            {"$setOnInsert": {"created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        if result.upserted_id is None:
             return {"message": "Déjà en favori"}
-        
-        await favorites_collection.insert_one({
-            "user_id": current_user.username,
-            "tender_id": tender_id,
-            "created_at": datetime.utcnow()
-        })
         return {"message": "Ajouté aux favoris"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erreur ajout favori: {e}")
@@ -511,18 +671,23 @@ async def remove_tender_favorite(
 
 @router.get("/favorites/")
 async def list_tender_favorites(
+    fields: Optional[str] = None,
+    accept: Optional[str] = Header(None),
     db=Depends(get_tenders_collection),
     current_user: User = Depends(get_current_user)
 ):
     """Lister les appels d'offres favoris"""
+    projection = parse_fields(fields, LIST_PROJECTION)
     try:
         favorites_collection = db.database['tender_favorites']
-        cursor = favorites_collection.find({"user_id": current_user.username})
+        cursor = favorites_collection.find({"user_id": current_user.username}, {"tender_id": 1})
         tender_ids = [fav["tender_id"] async for fav in cursor]
         
         # Récupérer les appels d'offres complets
-        tender_cursor = db.find({"_id": {"$in": [ObjectId(tid) for tid in tender_ids]}})
-        tender_list = [serialize_doc(doc) async for doc in tender_cursor]
-        return tender_list
+        tender_cursor = raw_collection(db).find({"_id": {"$in": [ObjectId(tid) for tid in tender_ids]}}, projection)
+        if wants_ndjson(accept):
+            tender_cursor = tender_cursor.batch_size(STREAM_BATCH_SIZE)
+            return StreamingResponse(iter_ndjson(tender_cursor), media_type=NDJSON_MEDIA_TYPE)
+        return FastJSONResponse(content=decode_raw_all(await tender_cursor.to_list(length=None)))
     except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Erreur récupération favoris: {e}") 
\ No newline at end of file
+        raise HTTPException(status_code=400, detail=f"Erreur récupération favoris: {e}")
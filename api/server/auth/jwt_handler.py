@@ -3,9 +3,15 @@ from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Callable, Dict, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import time
 from api.server.database.models import User, UserInDB
 from api.server.database.connection import get_users_collection
+from api.server.utils.cache import LRUTTLCache
 
 # Configuration JWT
 SECRET_KEY = "supersecretkey"  # À changer en production !
@@ -16,13 +22,95 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/token")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+# Utilisateurs résolus par (username, version du token) : évite un find_one par requête.
+# Les modifications faites par ce processus invalident l'entrée immédiatement ; le TTL
+# borne le délai pour celles faites par un autre processus.
+user_cache = LRUTTLCache(
+    max_entries=int(os.getenv("USER_CACHE_MAX_ENTRIES", "1024")),
+    ttl_seconds=float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+)
+
+def invalidate_user(username: str, token_version: int = 0):
+    """Retire un utilisateur du cache (à appeler après toute modification de son document)"""
+    user_cache.pop((username, token_version))
+
+# bcrypt coûte 100 à 300 ms de CPU par appel : exécuté hors de la boucle d'événements,
+# dans un pool dédié et borné, avec une file d'attente limitée (429 au-delà)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+class PasswordHashingStats:
+    """Occupation du pool bcrypt, durées de calcul et d'attente (fenêtre glissante)"""
+
+    def __init__(self, window: int = 1000):
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_ms = deque(maxlen=window)
+        self.wait_ms = deque(maxlen=window)
+
+    def record(self, wait: float, duration: float):
+        self.completed += 1
+        self.wait_ms.append(wait * 1000)
+        self.hash_ms.append(duration * 1000)
+
+    @staticmethod
+    def _summary(values) -> Dict:
+        if not values:
+            return {"avg": None, "p95": None, "max": None}
+        ordered = sorted(values)
+        return {
+            "avg": round(sum(ordered) / len(ordered), 2),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            "max": round(ordered[-1], 2),
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "workers": PASSWORD_HASH_WORKERS,
+            "max_queue": PASSWORD_HASH_MAX_QUEUE,
+            "in_flight": self.in_flight,
+            "queued": max(self.in_flight - PASSWORD_HASH_WORKERS, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "hash_ms": self._summary(self.hash_ms),
+            "queue_wait_ms": self._summary(self.wait_ms),
+        }
+
+password_hashing = PasswordHashingStats()
+
+async def _run_bcrypt(func: Callable, *args):
+    """Exécute un calcul bcrypt dans le pool dédié ; 429 immédiat si la file est pleine"""
+    if password_hashing.in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        password_hashing.rejected += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Serveur d'authentification saturé, réessayez dans quelques secondes",
+            headers={"Retry-After": "2"},
+        )
+    submitted = time.perf_counter()
+
+    def timed():
+        started = time.perf_counter()
+        result = func(*args)
+        return result, started - submitted, time.perf_counter() - started
+
+    password_hashing.in_flight += 1
+    try:
+        result, wait, duration = await asyncio.get_running_loop().run_in_executor(password_executor, timed)
+    finally:
+        password_hashing.in_flight -= 1
+    password_hashing.record(wait, duration)
+    return result
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Vérifie un mot de passe"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return await _run_bcrypt(pwd_context.verify, plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash un mot de passe"""
-    return pwd_context.hash(password)
+    return await _run_bcrypt(pwd_context.hash, password)
 
 async def get_user(username: str) -> Optional[UserInDB]:
     """Récupère un utilisateur par son nom d'utilisateur"""
@@ -36,7 +124,8 @@ async def get_user(username: str) -> Optional[UserInDB]:
             disabled=user.get("disabled", False),
             role=user.get("role", "user"),
             hashed_password=user["hashed_password"],
-            date_creation=user.get("date_creation")
+            date_creation=user.get("date_creation"),
+            token_version=user.get("token_version", 0)
         )
     return None
 
@@ -45,7 +134,7 @@ async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     user = await get_user(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password(password, user.hashed_password):
         return None
     return user
 
@@ -57,6 +146,13 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_user_token(user: UserInDB) -> str:
+    """Token d'accès d'un utilisateur, lié à sa version de token courante"""
+    return create_access_token(
+        data={"sub": user.username, "tv": user.token_version},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
     """Récupère l'utilisateur courant depuis le token JWT"""
     credentials_exception = HTTPException(
@@ -69,12 +165,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
+        # Tokens émis avant l'ajout de la version : version 0
+        token_version = payload.get("tv", 0)
     except JWTError:
         raise credentials_exception
-    
-    user = await get_user(username)
+
+    key = (username, token_version)
+    user = user_cache.get(key)
     if user is None:
-        raise credentials_exception
+        user = await get_user(username)
+        if user is None:
+            raise credentials_exception
+        if user.token_version != token_version:
+            # Mot de passe changé ou compte désactivé depuis l'émission du token
+            raise credentials_exception
+        user_cache.set(key, user)
     if user.disabled:
         raise HTTPException(status_code=400, detail="Utilisateur désactivé")
     
@@ -84,4 +189,10 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
     """Vérifie que l'utilisateur est actif"""
     if current_user.disabled:
         raise HTTPException(status_code=400, detail="Utilisateur inactif")
-    return current_user 
\ No newline at end of file
+    return current_user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)) -> User:
+    """Vérifie que l'utilisateur est un administrateur actif"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Accès réservé aux administrateurs")
+    return current_user
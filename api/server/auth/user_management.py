@@ -1,15 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, Body
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Optional
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from api.server.database.models import User, UserCreate, UserInDB
 from api.server.database.connection import get_users_collection
 from api.server.auth.jwt_handler import (
     get_password_hash, 
     verify_password, 
-    create_access_token, 
+    create_user_token,
     get_current_user,
-    ACCESS_TOKEN_EXPIRE_MINUTES
+    invalidate_user
 )
 
 router = APIRouter()
@@ -23,7 +25,7 @@ async def register(user: UserCreate, db=Depends(get_users_collection)):
         raise HTTPException(status_code=400, detail="Nom d'utilisateur déjà utilisé")
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash(user.password)
     user_doc = {
         "username": user.username,
         "full_name": user.full_name,
@@ -33,7 +35,11 @@ async def register(user: UserCreate, db=Depends(get_users_collection)):
         "date_creation": datetime.utcnow()
     }
     
-    result = await db.insert_one(user_doc)
+    try:
+        result = await db.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Inscription concurrente du même nom (index unique sur username)
+        raise HTTPException(status_code=400, detail="Nom d'utilisateur déjà utilisé")
     return {
         "id": str(result.inserted_id), 
         "username": user.username,
@@ -56,10 +62,7 @@ async def login_for_access_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token = create_access_token(
-        data={"sub": user.username},
-        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    )
+    access_token = create_user_token(user)
     
     return {
         "access_token": access_token, 
@@ -95,17 +98,31 @@ async def change_password(
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
     
     # Vérifier l'ancien mot de passe
-    if not verify_password(old_password, user_doc["hashed_password"]):
+    if not await verify_password(old_password, user_doc["hashed_password"]):
         raise HTTPException(status_code=400, detail="Ancien mot de passe incorrect")
     
-    # Hash et sauvegarder le nouveau mot de passe
-    hashed = get_password_hash(new_password)
-    await db.update_one(
+    # Hash et sauvegarder le nouveau mot de passe ; les tokens déjà émis sont révoqués
+    hashed = await get_password_hash(new_password)
+    updated = await db.find_one_and_update(
         {"username": current_user.username}, 
-        {"$set": {"hashed_password": hashed}}
+        {"$set": {"hashed_password": hashed}, "$inc": {"token_version": 1}},
+        return_document=ReturnDocument.AFTER
     )
+    if not updated:
+        raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(current_user.username, updated["token_version"] - 1)
     
-    return {"message": "Mot de passe modifié avec succès"}
+    # Nouveau token pour la session en cours
+    user = UserInDB(
+        username=updated["username"],
+        hashed_password=updated["hashed_password"],
+        token_version=updated["token_version"]
+    )
+    return {
+        "message": "Mot de passe modifié avec succès",
+        "access_token": create_user_token(user),
+        "token_type": "bearer"
+    }
 
 @router.patch("/users/{username}/disable")
 async def set_user_disabled(
@@ -121,13 +138,16 @@ async def set_user_disabled(
     if username == current_user.username:
         raise HTTPException(status_code=400, detail="Impossible de se désactiver soi-même")
     
-    result = await db.update_one(
+    # La désactivation révoque aussi les tokens en cours
+    before = await db.find_one_and_update(
         {"username": username}, 
-        {"$set": {"disabled": disabled}}
+        {"$set": {"disabled": disabled}, "$inc": {"token_version": 1}},
+        return_document=ReturnDocument.BEFORE
     )
     
-    if result.matched_count == 0:
+    if before is None:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(username, before.get("token_version", 0))
     
     return {"message": f"Utilisateur {'désactivé' if disabled else 'réactivé'}"}
 
@@ -144,9 +164,10 @@ async def delete_user(
     if username == current_user.username:
         raise HTTPException(status_code=400, detail="Impossible de se supprimer soi-même")
     
-    result = await db.delete_one({"username": username})
-    if result.deleted_count == 0:
+    deleted = await db.find_one_and_delete({"username": username})
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    invalidate_user(username, deleted.get("token_version", 0))
     
     return {"message": "Utilisateur supprimé"}
 
@@ -171,10 +192,13 @@ async def admin_change_password(
     if user_doc.get("role") == "admin":
         raise HTTPException(status_code=403, detail="Impossible de changer le mot de passe d'un autre admin")
     
-    hashed = get_password_hash(new_password)
-    await db.update_one(
+    hashed = await get_password_hash(new_password)
+    before = await db.find_one_and_update(
         {"username": username}, 
-        {"$set": {"hashed_password": hashed}}
+        {"$set": {"hashed_password": hashed}, "$inc": {"token_version": 1}},
+        return_document=ReturnDocument.BEFORE
     )
+    if before is not None:
+        invalidate_user(username, before.get("token_version", 0))
     
     return {"message": "Mot de passe modifié pour l'utilisateur"} 
\ No newline at end of file
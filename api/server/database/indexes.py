@@ -0,0 +1,160 @@
+from datetime import datetime
+from typing import Dict, List
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import OperationFailure
+
+# Index unique garantissant qu'un import en masse met à jour au lieu de dupliquer
+NATURAL_KEY_INDEX = "tenders_natural_key_unique"
+
+# Index requis par l'API, déclarés par collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="users_username_unique", unique=True),
+    ],
+    "dashboards": [
+        IndexModel([("user_id", ASCENDING), ("date_maj", DESCENDING)], name="dashboards_user_date_maj"),
+    ],
+    "tender_favorites": [
+        IndexModel(
+            [("user_id", ASCENDING), ("tender_id", ASCENDING)],
+            name="favorites_user_tender_unique",
+            unique=True
+        ),
+    ],
+    "appels_offres": [
+        # Tri de la pagination par curseur
+        IndexModel([("date_emission", DESCENDING), ("_id", DESCENDING)], name="tenders_date_emission_id"),
+        # Filtres des listes et statistiques, combinables avec une plage de dates
+        IndexModel([("categorie", ASCENDING), ("date_emission", DESCENDING)], name="tenders_categorie_date"),
+        IndexModel([("statut", ASCENDING), ("date_emission", DESCENDING)], name="tenders_statut_date"),
+        IndexModel([("pole", ASCENDING), ("date_emission", DESCENDING)], name="tenders_pole_date"),
+        # Clé naturelle des imports en masse (upsert par nom et date d'émission)
+        IndexModel(
+            [("nom_ao", ASCENDING), ("date_emission", ASCENDING)],
+            name=NATURAL_KEY_INDEX,
+            unique=True
+        ),
+        # Plages et regroupements sur la date typée (cf. database/migrations.py)
+        IndexModel([("date_emission_dt", DESCENDING)], name="tenders_date_emission_dt"),
+        # Rafraîchissements incrémentaux de l'index de recherche et de l'instantané en colonnes
+        IndexModel([("date_maj", ASCENDING)], name="tenders_date_maj"),
+        # Recherche plein texte (français, insensible aux accents)
+        IndexModel(
+            [("nom_ao", TEXT), ("commentaires_ia", TEXT), ("raison_perte", TEXT)],
+            name="tenders_text_fr",
+            default_language="french",
+            language_override="langue_recherche",
+            weights={"nom_ao": 10, "commentaires_ia": 2, "raison_perte": 2}
+        ),
+    ],
+}
+
+# Requêtes fréquentes vérifiées par /health/indexes (les valeurs n'influent pas sur le plan)
+HOT_QUERIES = [
+    {"name": "users.username", "collection": "users", "filter": {"username": "_"}},
+    {"name": "dashboards.user_id", "collection": "dashboards", "filter": {"user_id": "_"}},
+    {"name": "favorites.user_id", "collection": "tender_favorites", "filter": {"user_id": "_"}},
+    {
+        "name": "favorites.user_tender",
+        "collection": "tender_favorites",
+        "filter": {"user_id": "_", "tender_id": "_"}
+    },
+    {
+        "name": "tenders.list",
+        "collection": "appels_offres",
+        "filter": {},
+        "sort": {"date_emission": -1, "_id": -1}
+    },
+    {"name": "tenders.categorie", "collection": "appels_offres", "filter": {"categorie": "_"}},
+    {"name": "tenders.statut", "collection": "appels_offres", "filter": {"statut": "_"}},
+    {"name": "tenders.pole", "collection": "appels_offres", "filter": {"pole": "_"}},
+    {
+        "name": "tenders.date_range",
+        "collection": "appels_offres",
+        "filter": {"date_emission": {"$gte": "2000-01-01", "$lte": "2000-12-31"}}
+    },
+    {
+        "name": "tenders.date_range_typed",
+        "collection": "appels_offres",
+        "filter": {"date_emission_dt": {"$gte": datetime(2000, 1, 1), "$lte": datetime(2000, 12, 31)}}
+    },
+    {
+        "name": "tenders.natural_key",
+        "collection": "appels_offres",
+        "filter": {"nom_ao": "_", "date_emission": "_"}
+    },
+    {
+        "name": "tenders.modified_since",
+        "collection": "appels_offres",
+        "filter": {"date_maj": {"$gt": datetime(2000, 1, 1)}}
+    },
+    {"name": "tenders.text", "collection": "appels_offres", "filter": {"$text": {"$search": "_"}}},
+]
+
+async def ensure_indexes(db):
+    """Crée les index déclarés dans INDEXES (opération idempotente)"""
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        for model in models:
+            try:
+                await collection.create_indexes([model])
+            except OperationFailure as e:
+                # Ex: doublons existants empêchant un index unique
+                print(f"⚠️ Index {model.document['name']} non créé sur {collection_name}: {e}")
+
+async def missing_indexes(db) -> Dict[str, List[str]]:
+    """Index déclarés dans INDEXES mais absents de la base, par collection"""
+    missing = {}
+    for collection_name, models in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        names = [model.document["name"] for model in models if model.document["name"] not in existing]
+        if names:
+            missing[collection_name] = names
+    return missing
+
+def _plan_stages(plan, stages=None, indexes=None):
+    """Parcourt récursivement un plan d'exécution et collecte les étapes et index utilisés"""
+    if stages is None:
+        stages, indexes = [], []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        if "indexName" in plan:
+            indexes.append(plan["indexName"])
+        for value in plan.values():
+            _plan_stages(value, stages, indexes)
+    elif isinstance(plan, list):
+        for item in plan:
+            _plan_stages(item, stages, indexes)
+    return stages, indexes
+
+async def explain_hot_queries(db) -> Dict:
+    """Explique les requêtes fréquentes et signale celles qui font un COLLSCAN, ainsi que les index absents"""
+    report = []
+    for query in HOT_QUERIES:
+        find_cmd = {"find": query["collection"], "filter": query["filter"]}
+        if "sort" in query:
+            find_cmd["sort"] = query["sort"]
+        try:
+            explain = await db.command({"explain": find_cmd, "verbosity": "queryPlanner"})
+        except OperationFailure as e:
+            report.append({"name": query["name"], "collection": query["collection"], "error": str(e)})
+            continue
+        stages, indexes = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({
+            "name": query["name"],
+            "collection": query["collection"],
+            "stages": stages,
+            "indexes": sorted(set(indexes)),
+            "collscan": "COLLSCAN" in stages
+        })
+
+    collscans = [q["name"] for q in report if q.get("collscan") or "error" in q]
+    # Ex: un index unique non créé à cause de doublons existants (cf. ensure_indexes)
+    missing = await missing_indexes(db)
+    return {
+        "status": "degraded" if collscans or missing else "ok",
+        "collscans": collscans,
+        "missing_indexes": missing,
+        "queries": report
+    }
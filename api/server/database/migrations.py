@@ -0,0 +1,193 @@
+import asyncio
+import sys
+import uuid
+from datetime import datetime
+from typing import Callable, Dict
+
+from pymongo import UpdateOne
+
+from api.server.utils.tender_fields import (
+    TYPED_DATE_FIELDS, DERIVED_FIELDS, derived_fields, missing_derived_fields, typed_dates
+)
+
+MIGRATIONS_COLLECTION = "migrations"
+DEFAULT_BATCH_SIZE = 1000
+
+class TypedDatesState:
+    """Indique si tous les appels d'offres ont leurs dates typées"""
+    def __init__(self):
+        self.ready = False
+
+typed_dates_state = TypedDatesState()
+
+async def _run_batched(
+    db,
+    name: str,
+    projection: Dict,
+    compute: Callable[[Dict], Dict],
+    batch_size: int,
+    restart: bool
+) -> int:
+    """Applique `compute` à tous les appels d'offres par lots bornés, dans l'ordre des _id.
+
+    La progression (dernier _id traité) est enregistrée après chaque lot : une exécution
+    interrompue reprend là où elle s'était arrêtée, et une nouvelle exécution ne traite
+    que les documents insérés depuis. Un document pour lequel `compute` ne renvoie
+    rien n'est pas réécrit.
+    """
+    collection = db["appels_offres"]
+    migrations = db[MIGRATIONS_COLLECTION]
+    state = {} if restart else (await migrations.find_one({"_id": name}) or {})
+    last_id = state.get("last_id")
+    processed = 0
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = await collection.find(query, projection).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        operations = []
+        for doc in docs:
+            fields = compute(doc)
+            if fields:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": fields}))
+        if operations:
+            await collection.bulk_write(operations, ordered=False)
+        last_id = docs[-1]["_id"]
+        processed += len(docs)
+        await migrations.update_one(
+            {"_id": name},
+            {"$set": {"last_id": last_id, "done": False, "updated_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    await migrations.update_one(
+        {"_id": name},
+        {"$set": {"done": True, "completed_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return processed
+
+async def migrate_typed_dates(db, batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False) -> int:
+    """Ajoute date_emission_dt et date_reponse_dt à côté des dates en chaîne"""
+    projection = {source: 1 for source in TYPED_DATE_FIELDS}
+    processed = await _run_batched(db, "typed_dates", projection, typed_dates, batch_size, restart)
+    typed_dates_state.ready = True
+    return processed
+
+async def backfill_derived_fields(
+    db,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    restart: bool = False,
+    force: bool = False
+) -> int:
+    """Calcule les écarts et ratios des appels d'offres existants.
+
+    Seuls les champs absents sont complétés ; `force` recalcule aussi ceux déjà
+    renseignés (valeurs saisies à la main comprises).
+    """
+    projection = {field: 1 for field in ("prix_client", "prix_gagnant", "score_client", "score_gagnant")}
+    projection.update({field: 1 for field in DERIVED_FIELDS})
+    compute = derived_fields if force else missing_derived_fields
+    return await _run_batched(db, "derived_fields", projection, compute, batch_size, restart)
+
+async def check_typed_dates(db):
+    """Active les dates typées si la migration est terminée et qu'aucun document n'a été oublié"""
+    try:
+        state = await db[MIGRATIONS_COLLECTION].find_one({"_id": "typed_dates"})
+        missing = await db["appels_offres"].count_documents({"date_emission_dt": {"$exists": False}}, limit=1)
+        typed_dates_state.ready = bool(state and state.get("done")) and missing == 0
+    except Exception as e:
+        print(f"⚠️ État de la migration des dates inconnu: {e}")
+        typed_dates_state.ready = False
+
+async def backfill_on_startup(db) -> int:
+    """Complète les champs dérivés des documents ajoutés hors API depuis la dernière exécution"""
+    from api.server.stats.cache import bump_generation
+    from api.server.stats.columnar import columnar_engine
+
+    try:
+        processed = await backfill_derived_fields(db)
+    except Exception as e:
+        print(f"⚠️ Champs dérivés non calculés: {e}")
+        return 0
+    if processed:
+        # Ces écritures ne modifient pas date_maj : l'instantané en colonnes est rechargé
+        columnar_engine.snapshot.invalidate()
+        bump_generation()
+    return processed
+
+# Widgets créés avant l'ajout d'instance_id
+MISSING_INSTANCE_ID = {"graphiques": {"$elemMatch": {"instance_id": None}}}
+
+async def assign_chart_instance_ids(db, batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False) -> int:
+    """Attribue un instance_id aux widgets qui n'en ont pas.
+
+    Les modifications de tableaux de bord ciblent les widgets par instance_id (arrayFilters).
+    Chaque document n'est réécrit que si ses graphiques n'ont pas changé entre-temps.
+    """
+    dashboards = db["dashboards"]
+    processed = 0
+    while True:
+        docs = await dashboards.find(MISSING_INSTANCE_ID, {"graphiques": 1}).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        operations = []
+        for doc in docs:
+            graphiques = [
+                {**chart, "instance_id": chart.get("instance_id") or str(uuid.uuid4())}
+                for chart in doc["graphiques"]
+            ]
+            operations.append(UpdateOne(
+                {"_id": doc["_id"], "graphiques": doc["graphiques"]},
+                {"$set": {"graphiques": graphiques, "date_maj": datetime.utcnow()}, "$inc": {"version": 1}}
+            ))
+        result = await dashboards.bulk_write(operations, ordered=False)
+        processed += result.modified_count
+    return processed
+
+async def assign_instance_ids_on_startup(db) -> int:
+    try:
+        return await assign_chart_instance_ids(db)
+    except Exception as e:
+        print(f"⚠️ instance_id des widgets non attribués: {e}")
+        return 0
+
+MIGRATIONS = {
+    "typed-dates": migrate_typed_dates,
+    "derived-fields": backfill_derived_fields,
+    "chart-instance-ids": assign_chart_instance_ids,
+}
+
+async def main(argv):
+    """Commande : python -m api.server.database.migrations <typed-dates|derived-fields|chart-instance-ids> [--batch-size N] [--restart]
+
+    derived-fields accepte aussi --force : recalcule et écrase les champs dérivés de
+    tous les documents (implique --restart).
+    """
+    from dotenv import load_dotenv
+    from api.server.database.connection import db_manager
+
+    args = argv[1:]
+    force = "--force" in args
+    if not args or args[0] not in MIGRATIONS or (force and args[0] != "derived-fields"):
+        print(
+            f"Usage: python -m api.server.database.migrations <{'|'.join(MIGRATIONS)}> [--batch-size N] [--restart]\n"
+            "       python -m api.server.database.migrations derived-fields --force [--batch-size N]"
+        )
+        return 1
+    batch_size = int(args[args.index("--batch-size") + 1]) if "--batch-size" in args else DEFAULT_BATCH_SIZE
+    options = {"restart": "--restart" in args or force}
+    if force:
+        options["force"] = True
+    load_dotenv(dotenv_path=".env")
+    await db_manager.connect()
+    try:
+        count = await MIGRATIONS[args[0]](db_manager.get_database(), batch_size, **options)
+        print(f"✅ {args[0]}: {count} documents traités")
+    finally:
+        await db_manager.disconnect()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv)))
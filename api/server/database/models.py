@@ -24,8 +24,31 @@ class TenderBase(BaseModel):
 class TenderCreate(TenderBase):
     pass
 
+class TenderUpdate(BaseModel):
+    """Modification partielle (PATCH) : seuls les champs envoyés sont modifiés"""
+    nom_ao: Optional[str] = None
+    categorie: Optional[str] = None
+    pole: Optional[str] = None
+    statut: Optional[str] = None
+    date_emission: Optional[str] = None
+    date_reponse: Optional[str] = None
+    prix_client: Optional[float] = None
+    prix_gagnant: Optional[float] = None
+    note_technique: Optional[float] = None
+    note_prix: Optional[float] = None
+    score_client: Optional[float] = None
+    score_gagnant: Optional[float] = None
+    delai_jours: Optional[int] = None
+    commentaires_ia: Optional[str] = None
+    raison_perte: Optional[str] = None
+
 class Tender(TenderBase):
     id: Optional[str] = Field(None, alias="_id")
+    # Champs dérivés calculés à l'écriture (cf. utils/tender_fields.py)
+    ecart_prix: Optional[float] = None
+    ecart_score: Optional[float] = None
+    ratio_prix: Optional[float] = None
+    ratio_score: Optional[float] = None
     date_creation: Optional[datetime] = None
     date_maj: Optional[datetime] = None
 
@@ -47,6 +70,7 @@ class Chart(BaseModel):
     size: Optional[str] = None
     height: Optional[str] = None
     order: Optional[int] = None
+    customTitle: Optional[str] = None
 
 class DashboardBase(BaseModel):
     nom: str
@@ -61,6 +85,8 @@ class Dashboard(DashboardBase):
     user_id: str
     date_creation: Optional[datetime] = None
     date_maj: Optional[datetime] = None
+    # Incrémentée ($inc) à chaque écriture : comparaison des opérations groupées
+    version: int = 0
 
     class Config:
         allow_population_by_field_name = True
@@ -86,6 +112,8 @@ class User(UserBase):
 
 class UserInDB(User):
     hashed_password: str
+    # Incrémenté à chaque changement de mot de passe ou désactivation : révoque les tokens émis avant
+    token_version: int = 0
 
 # Modèles pour les Favoris
 class Favorite(BaseModel):
@@ -104,7 +132,8 @@ class ApiResponse(BaseModel):
 
 class PaginatedResponse(BaseModel):
     items: List[Dict]
-    total: int
-    page: int
     size: int
-    pages: int 
\ No newline at end of file
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+    page: Optional[int] = None
+    pages: Optional[int] = None 
\ No newline at end of file
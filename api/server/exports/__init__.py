@@ -0,0 +1 @@
+# Exports package
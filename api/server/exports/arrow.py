@@ -0,0 +1,148 @@
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from api.server.utils.data_helpers import parse_date
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dépendance optionnelle : les exports colonnes renvoient alors 501
+    pa = None
+    pq = None
+
+# Lignes par record batch (et par groupe de lignes Parquet)
+EXPORT_BATCH_ROWS = 5000
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+# Type de chaque colonne exportée
+STRING_COLUMNS = (
+    "_id", "nom_ao", "categorie", "pole", "statut", "date_emission", "date_reponse",
+    "commentaires_ia", "raison_perte"
+)
+FLOAT_COLUMNS = (
+    "prix_client", "prix_gagnant", "note_technique", "note_prix", "score_client", "score_gagnant",
+    "ecart_prix", "ecart_score", "ratio_prix", "ratio_score"
+)
+INTEGER_COLUMNS = ("delai_jours",)
+TIMESTAMP_COLUMNS = ("date_emission_dt", "date_reponse_dt", "date_creation", "date_maj")
+EXPORT_COLUMNS = STRING_COLUMNS + INTEGER_COLUMNS + FLOAT_COLUMNS + TIMESTAMP_COLUMNS
+
+def available() -> bool:
+    return pa is not None
+
+def _field_type(column: str):
+    if column in FLOAT_COLUMNS:
+        return pa.float64()
+    if column in INTEGER_COLUMNS:
+        return pa.int64()
+    if column in TIMESTAMP_COLUMNS:
+        return pa.timestamp("ms")
+    return pa.string()
+
+def export_schema(projection: Optional[Dict]) -> "pa.Schema":
+    """Schéma typé des colonnes exportées (toutes, ou celles de la projection `fields`)"""
+    if projection and any(value == 1 for value in projection.values()):
+        columns = [c for c in EXPORT_COLUMNS if c == "_id" or projection.get(c) == 1]
+    else:
+        columns = [c for c in EXPORT_COLUMNS if not projection or projection.get(c) != 0]
+    return pa.schema([(column, _field_type(column)) for column in columns])
+
+def _float(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+def _integer(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return None
+
+def _string(value) -> Optional[str]:
+    return None if value is None else str(value)
+
+def _timestamp(value) -> Optional[datetime]:
+    return value if isinstance(value, datetime) else parse_date(value)
+
+def _converter(column: str):
+    if column in FLOAT_COLUMNS:
+        return _float
+    if column in INTEGER_COLUMNS:
+        return _integer
+    if column in TIMESTAMP_COLUMNS:
+        return _timestamp
+    return _string
+
+def to_record_batch(docs: List[Dict], schema: "pa.Schema") -> "pa.RecordBatch":
+    """Convertit des documents en record batch ; une valeur du mauvais type devient nulle"""
+    arrays = []
+    for field in schema:
+        convert = _converter(field.name)
+        arrays.append(pa.array([convert(doc.get(field.name)) for doc in docs], type=field.type))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+class _ChunkSink:
+    """Sortie non positionnable : accumule les octets écrits jusqu'à leur envoi"""
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def _open_writer(fmt: str, sink: "pa.PythonFile", schema: "pa.Schema"):
+    if fmt == "parquet":
+        return pq.ParquetWriter(sink, schema, compression="zstd")
+    return pa.ipc.new_stream(sink, schema)
+
+async def iter_columnar_export(cursor, fmt: str, schema: "pa.Schema") -> AsyncIterator[bytes]:
+    """Lit le curseur par lots, écrit chaque lot en record batch et envoie les octets produits.
+
+    La conversion et l'encodage (compression Parquet) se font hors de la boucle d'événements.
+    """
+    sink = _ChunkSink()
+    output = pa.PythonFile(sink, mode="w")
+    writer = await run_in_threadpool(_open_writer, fmt, output, schema)
+
+    def write(docs):
+        writer.write_batch(to_record_batch(docs, schema))
+        return sink.drain()
+
+    def close():
+        writer.close()
+        output.close()
+        return sink.drain()
+
+    batch = []
+    async for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            data = await run_in_threadpool(write, batch)
+            batch = []
+            if data:
+                yield data
+    if batch:
+        data = await run_in_threadpool(write, batch)
+        if data:
+            yield data
+    data = await run_in_threadpool(close)
+    if data:
+        yield data
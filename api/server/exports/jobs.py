@@ -0,0 +1,240 @@
+import asyncio
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Exports exécutés en parallèle ; les suivants attendent leur tour
+EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+# Admission : travaux en attente ou en cours, au total et par utilisateur
+EXPORT_JOB_MAX_PENDING = int(os.getenv("EXPORT_JOB_MAX_PENDING", "8"))
+EXPORT_JOB_MAX_PER_USER = int(os.getenv("EXPORT_JOB_MAX_PER_USER", "2"))
+# Durée de conservation d'un travail terminé et de son fichier
+EXPORT_JOB_TTL_SECONDS = float(os.getenv("EXPORT_JOB_TTL_SECONDS", "3600"))
+EXPORT_JOB_CLEANUP_INTERVAL = 60
+EXPORT_SPOOL_DIR = os.getenv("EXPORT_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "llao-exports"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE_STATUSES = (PENDING, RUNNING)
+
+class AdmissionError(Exception):
+    """Trop de travaux d'export en attente (global ou pour l'utilisateur)"""
+
+class _CountingCursor:
+    """Curseur Motor qui compte les documents lus, pour la progression du travail"""
+    def __init__(self, cursor, job: "ExportJob"):
+        self._cursor = cursor
+        self._job = job
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        doc = await self._cursor.__anext__()
+        self._job.rows += 1
+        return doc
+
+    async def to_list(self, length: Optional[int] = None) -> List:
+        docs = await self._cursor.to_list(length=length)
+        self._job.rows += len(docs)
+        return docs
+
+@dataclass
+class ExportJob:
+    id: str
+    owner: str
+    format: str
+    filename: str
+    media_type: str
+    total: Optional[int] = None
+    rows: int = 0
+    bytes_written: int = 0
+    status: str = PENDING
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    path: Optional[str] = None
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    def to_dict(self) -> Dict:
+        progress = None
+        if self.status == DONE:
+            progress = 1.0
+        elif self.total:
+            progress = round(min(self.rows / self.total, 1.0), 4)
+        expires_at = self.finished_at + EXPORT_JOB_TTL_SECONDS if self.finished_at else None
+        return {
+            "id": self.id,
+            "format": self.format,
+            "status": self.status,
+            "rows": self.rows,
+            "total": self.total,
+            "progress": progress,
+            "bytes": self.bytes_written,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": expires_at,
+            "filename": self.filename,
+        }
+
+class ExportJobManager:
+    """Travaux d'export en arrière-plan : file bornée, fichiers résultats sur disque, expiration"""
+
+    def __init__(self, spool_dir: str = EXPORT_SPOOL_DIR, workers: int = EXPORT_JOB_WORKERS):
+        self.spool_dir = spool_dir
+        self.workers = workers
+        self.jobs: Dict[str, ExportJob] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # Créé à la première utilisation, dans la boucle d'événements du serveur
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    def active(self, owner: Optional[str] = None) -> List[ExportJob]:
+        return [
+            job for job in self.jobs.values()
+            if job.status in ACTIVE_STATUSES and (owner is None or job.owner == owner)
+        ]
+
+    def submit(
+        self,
+        owner: str,
+        fmt: str,
+        filename: str,
+        media_type: str,
+        total: Optional[int],
+        open_cursor: Callable,
+        produce: Callable[..., AsyncIterator[bytes]]
+    ) -> ExportJob:
+        """Enregistre un travail et le lance dès qu'un emplacement se libère.
+
+        `open_cursor()` renvoie le curseur Motor ; `produce(cursor)` les octets du fichier.
+        Lève AdmissionError si la file globale ou celle de l'utilisateur est pleine.
+        """
+        if len(self.active()) >= EXPORT_JOB_MAX_PENDING:
+            raise AdmissionError("Trop d'exports en cours, réessayez plus tard")
+        if len(self.active(owner)) >= EXPORT_JOB_MAX_PER_USER:
+            raise AdmissionError("Nombre maximal d'exports simultanés atteint pour cet utilisateur")
+
+        job = ExportJob(
+            id=uuid.uuid4().hex, owner=owner, format=fmt, filename=filename,
+            media_type=media_type, total=total
+        )
+        self.jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, open_cursor, produce))
+        return job
+
+    def get(self, job_id: str, owner: str) -> Optional[ExportJob]:
+        job = self.jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    async def _run(self, job: ExportJob, open_cursor: Callable, produce: Callable):
+        async with self._semaphore():
+            if job.status == CANCELLED:
+                return
+            job.status = RUNNING
+            job.started_at = time.time()
+            await run_in_threadpool(os.makedirs, self.spool_dir, exist_ok=True)
+            path = os.path.join(self.spool_dir, f"{job.id}.part")
+            try:
+                handle = await run_in_threadpool(open, path, "wb")
+                try:
+                    async for chunk in produce(_CountingCursor(open_cursor(), job)):
+                        await run_in_threadpool(handle.write, chunk)
+                        job.bytes_written += len(chunk)
+                finally:
+                    await run_in_threadpool(handle.close)
+                final_path = os.path.join(self.spool_dir, f"{job.id}.{job.format}")
+                await run_in_threadpool(os.replace, path, final_path)
+                job.path = final_path
+                job.status = DONE
+            except asyncio.CancelledError:
+                job.status = CANCELLED
+                await run_in_threadpool(_remove, path)
+                raise
+            except Exception as e:
+                print(f"⚠️ Échec de l'export {job.id}: {e}")
+                job.status = FAILED
+                job.error = str(e)
+                await run_in_threadpool(_remove, path)
+            finally:
+                job.finished_at = time.time()
+
+    async def cancel(self, job: ExportJob):
+        """Annule un travail en cours ou supprime le fichier d'un travail terminé"""
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        job.status = CANCELLED if job.status in ACTIVE_STATUSES else job.status
+        self.jobs.pop(job.id, None)
+        if job.path:
+            await run_in_threadpool(_remove, job.path)
+
+    async def cleanup(self) -> int:
+        """Supprime les travaux terminés depuis plus que le TTL, et leurs fichiers"""
+        now = time.time()
+        expired = [
+            job for job in self.jobs.values()
+            if job.finished_at is not None and now - job.finished_at > EXPORT_JOB_TTL_SECONDS
+        ]
+        for job in expired:
+            self.jobs.pop(job.id, None)
+            if job.path:
+                await run_in_threadpool(_remove, job.path)
+        return len(expired)
+
+    async def shutdown(self):
+        for job in self.active():
+            if job.task is not None:
+                job.task.cancel()
+        await asyncio.gather(*(job.task for job in self.jobs.values() if job.task), return_exceptions=True)
+        # Les travaux ne survivent pas au redémarrage : leurs fichiers non plus
+        for job in list(self.jobs.values()):
+            if job.path:
+                await run_in_threadpool(_remove, job.path)
+        self.jobs.clear()
+
+    def stats(self) -> Dict:
+        counts: Dict[str, int] = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.workers,
+            "max_pending": EXPORT_JOB_MAX_PENDING,
+            "max_per_user": EXPORT_JOB_MAX_PER_USER,
+            "ttl_seconds": EXPORT_JOB_TTL_SECONDS,
+            "spool_dir": self.spool_dir,
+            "jobs": counts,
+        }
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+export_jobs = ExportJobManager()
+
+async def maintain_export_jobs():
+    """Tâche de fond : expiration périodique des travaux terminés"""
+    while True:
+        await asyncio.sleep(EXPORT_JOB_CLEANUP_INTERVAL)
+        try:
+            await export_jobs.cleanup()
+        except Exception as e:
+            print(f"⚠️ Exports expirés non supprimés: {e}")
@@ -0,0 +1,253 @@
+import asyncio
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Hashable, List, Optional
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+from api.server.utils.cache import LRUTTLCache
+
+PDF_MEDIA_TYPE = "application/pdf"
+MARGIN = 2 * cm
+MAX_TABLE_ROWS = 60
+MAX_BARS = 15
+BAR_COLOR = (0.18, 0.42, 0.71)
+
+# Rapports déjà rendus, par (tableau de bord, version du tableau de bord, version des données)
+pdf_cache = LRUTTLCache(
+    max_entries=int(os.getenv("PDF_CACHE_MAX_ENTRIES", "32")),
+    ttl_seconds=float(os.getenv("PDF_CACHE_TTL_SECONDS", "600"))
+)
+
+# Rendu
+
+def _format(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:,.2f}".replace(",", " ")
+    return str(value)
+
+def _flatten(row: Dict) -> Dict:
+    """Remonte les clés d'un _id composé ({"mois", "statut"}) au niveau de la ligne"""
+    flat = {}
+    key = row.get("_id")
+    if isinstance(key, dict):
+        flat.update(key)
+    else:
+        flat["groupe"] = key
+    flat.update({k: v for k, v in row.items() if k != "_id"})
+    return flat
+
+class _Report:
+    """Mise en page séquentielle d'un rapport multi-pages sur un canvas reportlab"""
+
+    def __init__(self, buffer, title: str, subtitle: str):
+        self.canvas = canvas.Canvas(buffer, pagesize=A4)
+        self.canvas.setTitle(title)
+        self.width, self.height = A4
+        self.title = title
+        self.subtitle = subtitle
+        self.page = 1
+        self.y = self.height - MARGIN
+        self._header()
+
+    def _header(self):
+        c = self.canvas
+        c.setFont("Helvetica-Bold", 16 if self.page == 1 else 10)
+        c.drawString(MARGIN, self.y, self.title)
+        self.y -= 0.6 * cm
+        if self.page == 1:
+            c.setFont("Helvetica", 9)
+            c.drawString(MARGIN, self.y, self.subtitle)
+            self.y -= 0.8 * cm
+
+    def _footer(self):
+        self.canvas.setFont("Helvetica", 8)
+        self.canvas.drawRightString(self.width - MARGIN, MARGIN / 2, f"Page {self.page}")
+
+    def new_page(self):
+        self._footer()
+        self.canvas.showPage()
+        self.page += 1
+        self.y = self.height - MARGIN
+        self._header()
+
+    def ensure(self, height: float):
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def text(self, value: str, font: str = "Helvetica", size: float = 9, indent: float = 0):
+        """Texte avec retour à la ligne automatique"""
+        max_width = self.width - 2 * MARGIN - indent
+        for paragraph in (value or "").splitlines() or [""]:
+            line = ""
+            for word in paragraph.split(" "):
+                candidate = f"{line} {word}".strip()
+                if line and stringWidth(candidate, font, size) > max_width:
+                    self._line(line, font, size, indent)
+                    line = word
+                else:
+                    line = candidate
+            self._line(line, font, size, indent)
+
+    def _line(self, value: str, font: str, size: float, indent: float):
+        self.ensure(size * 1.4)
+        self.canvas.setFont(font, size)
+        self.canvas.drawString(MARGIN + indent, self.y - size, value)
+        self.y -= size * 1.4
+
+    def _fit(self, value: str, width: float, font: str, size: float) -> str:
+        if stringWidth(value, font, size) <= width:
+            return value
+        while value and stringWidth(value + "…", font, size) > width:
+            value = value[:-1]
+        return value + "…"
+
+    def table(self, rows: List[Dict]):
+        columns = []
+        for row in rows:
+            columns.extend(k for k in row if k not in columns)
+        if not columns:
+            return
+        col_width = (self.width - 2 * MARGIN) / len(columns)
+        row_height = 0.5 * cm
+
+        def header():
+            self.ensure(row_height * 2)
+            self.canvas.setFont("Helvetica-Bold", 8)
+            for i, column in enumerate(columns):
+                self.canvas.drawString(
+                    MARGIN + i * col_width, self.y - 8, self._fit(column, col_width - 4, "Helvetica-Bold", 8)
+                )
+            self.y -= row_height
+            self.canvas.line(MARGIN, self.y + 4, self.width - MARGIN, self.y + 4)
+
+        header()
+        for row in rows[:MAX_TABLE_ROWS]:
+            if self.y - row_height < MARGIN:
+                self.new_page()
+                header()
+            self.canvas.setFont("Helvetica", 8)
+            for i, column in enumerate(columns):
+                value = self._fit(_format(row.get(column)), col_width - 4, "Helvetica", 8)
+                self.canvas.drawString(MARGIN + i * col_width, self.y - 8, value)
+            self.y -= row_height
+        if len(rows) > MAX_TABLE_ROWS:
+            self.text(f"… {len(rows) - MAX_TABLE_ROWS} lignes supplémentaires non affichées", "Helvetica-Oblique", 8)
+
+    def bars(self, labels: List[str], values: List[float]):
+        """Histogramme horizontal simple des premières lignes"""
+        labels, values = labels[:MAX_BARS], values[:MAX_BARS]
+        peak = max((abs(v) for v in values), default=0)
+        if not peak:
+            return
+        bar_height = 0.45 * cm
+        label_width = 4 * cm
+        value_width = 2.5 * cm
+        span = self.width - 2 * MARGIN - label_width - value_width
+        for label, value in zip(labels, values):
+            self.ensure(bar_height + 2)
+            self.canvas.setFont("Helvetica", 8)
+            self.canvas.drawString(MARGIN, self.y - 9, self._fit(label, label_width - 4, "Helvetica", 8))
+            self.canvas.setFillColorRGB(*BAR_COLOR)
+            self.canvas.rect(MARGIN + label_width, self.y - bar_height + 2, span * abs(value) / peak, bar_height - 4,
+                             stroke=0, fill=1)
+            self.canvas.setFillColorRGB(0, 0, 0)
+            self.canvas.drawString(MARGIN + label_width + span + 4, self.y - 9, _format(value))
+            self.y -= bar_height
+        self.y -= 0.2 * cm
+
+    def save(self):
+        self._footer()
+        self.canvas.save()
+
+def _chart_series(rows: List[Dict]):
+    """Libellés et première mesure numérique des lignes, pour l'histogramme"""
+    if not rows:
+        return [], []
+    numeric = [k for k, v in rows[0].items() if isinstance(v, (int, float)) and not isinstance(v, bool)]
+    if not numeric:
+        return [], []
+    measure = numeric[0]
+    labels = [" / ".join(_format(v) for k, v in row.items() if k not in numeric) for row in rows]
+    values = [row.get(measure) or 0 for row in rows]
+    return labels, values
+
+def render_dashboard_pdf(report: Dict) -> bytes:
+    """Rend un rapport PDF multi-pages (exécuté dans un processus du pool).
+
+    `report` : {"nom", "sous_titre", "widgets": [{"titre", "filtres", "text", "data", "error"}]}
+    """
+    buffer = io.BytesIO()
+    doc = _Report(buffer, report["nom"], report.get("sous_titre", ""))
+    for widget in report["widgets"]:
+        doc.ensure(2 * cm)
+        doc.y -= 0.3 * cm
+        doc.text(widget.get("titre") or "", "Helvetica-Bold", 12)
+        filtres = widget.get("filtres") or {}
+        if filtres:
+            described = ", ".join(
+                f"{key}: {', '.join(value) if isinstance(value, list) else value}" for key, value in filtres.items()
+            )
+            doc.text(f"Filtres - {described}", "Helvetica-Oblique", 8)
+        if widget.get("text"):
+            doc.text(widget["text"])
+        if widget.get("error"):
+            doc.text(f"Données indisponibles : {widget['error']}", "Helvetica-Oblique", 9)
+        data = widget.get("data")
+        if data is not None:
+            rows = [_flatten(row) for row in data]
+            if not rows:
+                doc.text("Aucune donnée pour ces filtres", "Helvetica-Oblique", 9)
+            else:
+                labels, values = _chart_series(rows)
+                doc.bars(labels, values)
+                doc.table(rows)
+    doc.save()
+    return buffer.getvalue()
+
+# Pool de processus
+
+_pool: Optional[ProcessPoolExecutor] = None
+_inflight: Dict[Hashable, asyncio.Future] = {}
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn : pas de copie des threads et connexions du serveur dans les processus de rendu
+        _pool = ProcessPoolExecutor(
+            max_workers=int(os.getenv("PDF_RENDER_WORKERS", "2")),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+def shutdown_pdf_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+async def render_cached(key: Hashable, report: Dict) -> bytes:
+    """Rend un rapport hors de la boucle d'événements ; les rendus identiques sont partagés et mis en cache"""
+    cached = pdf_cache.get(key)
+    if cached is not None:
+        return cached
+    pending = _inflight.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_get_pool(), render_dashboard_pdf, report)
+    _inflight[key] = future
+    try:
+        pdf = await future
+    finally:
+        _inflight.pop(key, None)
+    pdf_cache.set(key, pdf)
+    return pdf
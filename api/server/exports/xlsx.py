@@ -0,0 +1,223 @@
+import asyncio
+import os
+import re
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence
+from xml.sax.saxutils import escape
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXPORT_BATCH_ROWS = 2000
+SHEET_NAME = "AppelsOffres"
+# Limite d'Excel : lignes par feuille, en-tête compris
+MAX_SHEET_ROWS = 1048576
+# Limite d'Excel pour le contenu d'une cellule
+MAX_CELL_CHARS = 32767
+# Caractères interdits en XML 1.0
+ILLEGAL_XML_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+EXCEL_EPOCH = datetime(1899, 12, 30)
+
+# Écriture des classeurs hors de la boucle d'événements, en nombre borné
+xlsx_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("EXPORT_XLSX_WORKERS", "2")),
+    thread_name_prefix="xlsx-export"
+)
+
+CONTENT_TYPES_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+)
+CONTENT_TYPES_SHEET = (
+    '<Override PartName="/xl/worksheets/sheet{index}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+)
+WORKBOOK_SHEET = '<sheet name="{name}" sheetId="{index}" r:id="rId{index}"/>'
+WORKBOOK_RELS_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rIdStyles" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+)
+WORKBOOK_RELS_SHEET = (
+    '<Relationship Id="rId{index}" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{index}.xml"/>'
+)
+# Style 0 : défaut ; style 1 : date et heure (format intégré 22)
+STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '</styleSheet>'
+)
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+def column_letter(index: int) -> str:
+    """Lettre de colonne Excel (0 -> A, 26 -> AA)"""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def sheet_name(index: int) -> str:
+    """Nom de la feuille n (à partir de 1) : AppelsOffres, AppelsOffres 2..."""
+    return SHEET_NAME if index == 1 else f"{SHEET_NAME} {index}"
+
+def _cell(ref: str, value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return f'<c r="{ref}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if value != value or value in (float("inf"), float("-inf")):
+            return ""
+        return f'<c r="{ref}"><v>{value!r}</v></c>'
+    if isinstance(value, datetime):
+        serial = (value.replace(tzinfo=None) - EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c r="{ref}" s="1"><v>{serial!r}</v></c>'
+    if isinstance(value, dict) and "$date" in value:
+        value = value["$date"]
+    text = ILLEGAL_XML_RE.sub("", str(value))[:MAX_CELL_CHARS]
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{escape(text)}</t></is></c>'
+
+class _ChunkSink:
+    """Sortie non positionnable : zipfile y écrit en mode flux (descripteurs de données)"""
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile ne lit la position que si le flux n'est pas positionnable
+        return self.position
+
+    def flush(self):
+        pass
+
+    def seekable(self) -> bool:
+        return False
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+class StreamingXlsxWriter:
+    """Classeur xlsx écrit ligne à ligne en mémoire constante.
+
+    Les cellules texte sont en ligne (inlineStr) : pas de table de chaînes partagées
+    à garder en mémoire jusqu'à la fin. Au-delà de `max_rows` lignes (limite d'Excel),
+    les suivantes continuent dans une nouvelle feuille, avec la même ligne d'en-tête.
+    """
+
+    def __init__(self, columns: Sequence[str], max_rows: int = MAX_SHEET_ROWS):
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.sheets = 0
+        self._refs = [column_letter(i) for i in range(len(self.columns))]
+        self._row = 0
+        self.sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self.sink, mode="w", compression=zipfile.ZIP_DEFLATED)
+        self._zip.writestr("_rels/.rels", ROOT_RELS)
+        self._zip.writestr("xl/styles.xml", STYLES)
+        self._open_sheet()
+
+    def _open_sheet(self):
+        self.sheets += 1
+        self._row = 0
+        self._sheet = self._zip.open(f"xl/worksheets/sheet{self.sheets}.xml", mode="w", force_zip64=True)
+        self._sheet.write(SHEET_START.encode("utf-8"))
+        self._write_row(self.columns)
+
+    def _close_sheet(self):
+        self._sheet.write(SHEET_END.encode("utf-8"))
+        self._sheet.close()
+
+    def _write_row(self, values: Sequence):
+        self._row += 1
+        row = self._row
+        cells = "".join(_cell(f"{ref}{row}", value) for ref, value in zip(self._refs, values))
+        self._sheet.write(f'<row r="{row}">{cells}</row>'.encode("utf-8"))
+
+    def write_docs(self, docs: List[Dict]) -> bytes:
+        """Ajoute des documents (une ligne chacun) et renvoie les octets compressés produits"""
+        for doc in docs:
+            if self._row >= self.max_rows:
+                self._close_sheet()
+                self._open_sheet()
+            self._write_row([doc.get(column) for column in self.columns])
+        return self.sink.drain()
+
+    def close(self) -> bytes:
+        self._close_sheet()
+        # Parties qui listent les feuilles : écrites une fois leur nombre connu
+        indexes = range(1, self.sheets + 1)
+        self._zip.writestr(
+            "[Content_Types].xml",
+            CONTENT_TYPES_START + "".join(CONTENT_TYPES_SHEET.format(index=i) for i in indexes) + "</Types>"
+        )
+        self._zip.writestr(
+            "xl/workbook.xml",
+            WORKBOOK_START
+            + "".join(WORKBOOK_SHEET.format(name=sheet_name(i), index=i) for i in indexes)
+            + "</sheets></workbook>"
+        )
+        self._zip.writestr(
+            "xl/_rels/workbook.xml.rels",
+            WORKBOOK_RELS_START + "".join(WORKBOOK_RELS_SHEET.format(index=i) for i in indexes) + "</Relationships>"
+        )
+        self._zip.close()
+        return self.sink.drain()
+
+async def iter_xlsx_export(
+    cursor, columns: Sequence[str], first_batch: Optional[List[Dict]] = None
+) -> AsyncIterator[bytes]:
+    """Écrit le classeur par lots dans le pool borné et envoie chaque morceau dès qu'il est prêt"""
+    loop = asyncio.get_running_loop()
+    writer = await loop.run_in_executor(xlsx_executor, StreamingXlsxWriter, columns)
+    batch = first_batch
+    if batch is None:
+        batch = await cursor.to_list(length=EXPORT_BATCH_ROWS)
+    while batch:
+        data = await loop.run_in_executor(xlsx_executor, writer.write_docs, batch)
+        if data:
+            yield data
+        batch = await cursor.to_list(length=EXPORT_BATCH_ROWS)
+    yield await loop.run_in_executor(xlsx_executor, writer.close)
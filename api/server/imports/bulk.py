@@ -0,0 +1,176 @@
+import os
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from starlette.concurrency import run_in_threadpool
+
+from api.server.database.models import TenderCreate
+from api.server.imports.readers import Row, read_chunks
+from api.server.stats.rollup import rollup_state, rollup_key, apply_bulk_write
+from api.server.utils.tender_fields import prepare_tender, write_operators
+
+# Lignes lues, validées et écrites par lot
+BULK_CHUNK_ROWS = int(os.getenv("BULK_IMPORT_CHUNK_ROWS", "5000"))
+# Erreurs détaillées renvoyées au plus (les suivantes sont seulement comptées)
+BULK_MAX_REPORTED_ERRORS = 1000
+# Au-delà, le rollup est reconstruit en une agrégation plutôt que par agrégat touché
+BULK_ROLLUP_REFRESH_MAX = 5000
+# Clé naturelle d'un appel d'offres : une réimportation met à jour au lieu de dupliquer
+NATURAL_KEY = ("nom_ao", "date_emission")
+NUMERIC_FIELDS = {
+    name for name, info in TenderCreate.model_fields.items()
+    if info.annotation in (Optional[float], Optional[int], float, int)
+}
+DATE_FIELDS = ("date_emission", "date_reponse")
+
+class ImportReport:
+    """Résultat d'un import : compteurs et erreurs par ligne"""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.duplicates = 0
+        self.error_count = 0
+        self.errors: List[Dict] = []
+        self.aborted: Optional[str] = None
+
+    def error(self, line: int, messages: List[str]):
+        self.error_count += 1
+        if len(self.errors) < BULK_MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "errors": messages})
+
+    def to_dict(self) -> Dict:
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "duplicates": self.duplicates,
+            "invalid": self.error_count,
+            "errors": self.errors,
+            "errors_truncated": self.error_count > len(self.errors),
+            "aborted": self.aborted,
+        }
+
+def _clean_value(field: str, value):
+    if isinstance(value, str):
+        value = value.strip()
+        if value == "":
+            return None
+        if field in NUMERIC_FIELDS:
+            # Décimales à la française dans les CSV et classeurs
+            return value.replace("\u00a0", "").replace("\u202f", "").replace(" ", "").replace(",", ".")
+    if isinstance(value, datetime) and field in DATE_FIELDS:
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    return value
+
+def _validation_messages(error: ValidationError) -> List[str]:
+    return [
+        f"{'.'.join(str(part) for part in e['loc']) or 'ligne'}: {e['msg']}"
+        for e in error.errors()
+    ]
+
+# Ligne validée : (numéro de ligne, document à écrire, champs dérivés à supprimer)
+Entry = Tuple[int, Dict, List[str]]
+
+def validate_chunk(rows: List[Row], now: datetime) -> Tuple[Dict[tuple, Entry], List[Tuple[int, List[str]]], int]:
+    """Valide un lot (exécuté dans le pool de threads).
+
+    Renvoie les documents prêts à écrire par clé naturelle (la dernière ligne l'emporte),
+    les erreurs par ligne et le nombre de doublons de clé dans le lot.
+    """
+    docs: Dict[tuple, Entry] = {}
+    errors: List[Tuple[int, List[str]]] = []
+    duplicates = 0
+    for line, values, read_error in rows:
+        if read_error:
+            errors.append((line, [read_error]))
+            continue
+        cleaned = {field: _clean_value(field, value) for field, value in values.items()}
+        try:
+            tender = TenderCreate.model_validate(cleaned)
+        except ValidationError as e:
+            errors.append((line, _validation_messages(e)))
+            continue
+        doc, unset = prepare_tender(tender.model_dump(), now)
+        key = tuple(doc[field] for field in NATURAL_KEY)
+        if key in docs:
+            duplicates += 1
+        docs[key] = (line, doc, unset)
+    return docs, errors, duplicates
+
+def _next_chunk(chunks: Iterator[List[Row]]) -> Optional[List[Row]]:
+    return next(chunks, None)
+
+async def _existing_keys(collection, docs: Dict[tuple, Entry]) -> List[Dict]:
+    """Clés du rollup des documents qui vont être remplacés (avant écriture)"""
+    names = list({key[0] for key in docs})
+    projection = {field: 1 for field in ("nom_ao", "date_emission", "categorie", "pole", "statut")}
+    keys = []
+    async for existing in collection.find({"nom_ao": {"$in": names}}, projection):
+        if (existing.get("nom_ao"), existing.get("date_emission")) in docs:
+            keys.append(rollup_key(existing))
+    return keys
+
+async def import_tenders(collection, file: BinaryIO, fmt: str) -> ImportReport:
+    """Importe un fichier par lots : lecture et validation dans le pool de threads,
+    puis upserts non ordonnés sur la clé naturelle (nom_ao, date_emission).
+
+    Le fichier est lu en flux ; seul le lot en cours est en mémoire.
+    """
+    report = ImportReport()
+    chunks = read_chunks(file, fmt, BULK_CHUNK_ROWS)
+    rollup_keys: List[Dict] = []
+    track_buckets = rollup_state.tracking
+
+    while True:
+        try:
+            rows = await run_in_threadpool(_next_chunk, chunks)
+        except Exception as e:
+            # Fichier tronqué, encodage invalide... : les lots déjà écrits sont conservés
+            report.aborted = f"Lecture interrompue après {report.rows} lignes: {e}"
+            break
+        if rows is None:
+            break
+        report.rows += len(rows)
+        now = datetime.utcnow()
+        docs, errors, duplicates = await run_in_threadpool(validate_chunk, rows, now)
+        report.duplicates += duplicates
+        for line, messages in errors:
+            report.error(line, messages)
+        if not docs:
+            continue
+
+        if track_buckets and report.rows <= BULK_ROLLUP_REFRESH_MAX:
+            rollup_keys.extend(await _existing_keys(collection, docs))
+            rollup_keys.extend(rollup_key(doc) for _, doc, _ in docs.values())
+        else:
+            track_buckets = False
+
+        entries = list(docs.values())
+        operations = [
+            UpdateOne(
+                {field: doc[field] for field in NATURAL_KEY},
+                {**write_operators(doc, unset), "$setOnInsert": {"date_creation": now}},
+                upsert=True
+            )
+            for _, doc, unset in entries
+        ]
+        try:
+            result = await collection.bulk_write(operations, ordered=False)
+            details = result.bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+            for write_error in details.get("writeErrors", []):
+                report.error(entries[write_error["index"]][0], [write_error.get("errmsg", "Erreur d'écriture")])
+        # date_maj change à chaque écriture : tout document trouvé est mis à jour
+        report.inserted += details.get("nUpserted", 0)
+        report.updated += details.get("nMatched", 0)
+
+    if report.inserted or report.updated:
+        # Met à jour le rollup (agrégats touchés ou reconstruction) et invalide le cache des statistiques
+        await apply_bulk_write(collection.database, rollup_keys if track_buckets else None)
+    return report
@@ -0,0 +1,104 @@
+import codecs
+import csv
+import zipfile
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import orjson
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+# Une ligne lue : (numéro de ligne dans le fichier, valeurs par colonne) ou erreur de lecture
+Row = Tuple[int, Optional[Dict], Optional[str]]
+
+IMPORT_FORMATS = ("csv", "xlsx", "ndjson")
+CSV_DELIMITERS = ";,\t"
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> Optional[str]:
+    """Format d'un fichier importé d'après son extension ou son type MIME"""
+    name = (filename or "").lower()
+    for extension, fmt in ((".csv", "csv"), (".xlsx", "xlsx"), (".ndjson", "ndjson"), (".jsonl", "ndjson")):
+        if name.endswith(extension):
+            return fmt
+    content_type = (content_type or "").lower()
+    if "csv" in content_type:
+        return "csv"
+    if "spreadsheetml" in content_type:
+        return "xlsx"
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return None
+
+# CSV
+
+def read_csv(file: BinaryIO) -> Iterator[Row]:
+    """Lignes d'un CSV UTF-8 (BOM accepté), séparateur ; , ou tabulation détecté sur l'en-tête"""
+    text = codecs.getreader("utf-8-sig")(file)
+    header_line = text.readline()
+    counts = {d: header_line.count(d) for d in CSV_DELIMITERS}
+    delimiter = max(counts, key=counts.get)
+    header = next(csv.reader([header_line], delimiter=delimiter), [])
+    columns = [column.strip() for column in header]
+    reader = csv.reader(text, delimiter=delimiter)
+    for values in reader:
+        if not any(values):
+            continue
+        yield reader.line_num + 1, dict(zip(columns, values)), None
+
+# NDJSON
+
+def read_ndjson(file: BinaryIO) -> Iterator[Row]:
+    """Un objet JSON par ligne ; les lignes vides sont ignorées"""
+    for line_no, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            value = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_no, None, f"JSON invalide: {e}"
+            continue
+        if not isinstance(value, dict):
+            yield line_no, None, "Chaque ligne doit être un objet JSON"
+            continue
+        yield line_no, value, None
+
+# xlsx
+
+def read_xlsx(file: BinaryIO) -> Iterator[Row]:
+    """Lignes de la première feuille d'un classeur, lues en flux (openpyxl en lecture seule).
+
+    Les cellules date sont renvoyées en datetime.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError):
+        yield 0, None, "Fichier xlsx invalide"
+        return
+    try:
+        sheet = workbook.worksheets[0]
+        # La dimension déclarée dans le fichier n'est pas toujours fiable
+        sheet.reset_dimensions()
+        rows = enumerate(sheet.iter_rows(values_only=True), start=1)
+        header = next(rows, (0, ()))[1]
+        columns = [str(value or "").strip() for value in header]
+        for line_no, values in rows:
+            if not any(v not in (None, "") for v in values):
+                continue
+            yield line_no, {column: value for column, value in zip(columns, values) if column}, None
+    finally:
+        workbook.close()
+
+READERS = {"csv": read_csv, "xlsx": read_xlsx, "ndjson": read_ndjson}
+
+def read_rows(file: BinaryIO, fmt: str) -> Iterator[Row]:
+    return READERS[fmt](file)
+
+def read_chunks(file: BinaryIO, fmt: str, size: int) -> Iterator[List[Row]]:
+    """Regroupe les lignes lues par paquets de `size`"""
+    chunk: List[Row] = []
+    for row in read_rows(file, fmt):
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
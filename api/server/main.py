@@ -1,14 +1,58 @@
 from dotenv import load_dotenv
 load_dotenv(dotenv_path=".env")
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from api.server.api import dashboards, tenders
+from api.server.api import dashboards, tenders, jobs
 from api.server.auth import router as auth_router
+from api.server.auth.jwt_handler import user_cache, password_hashing, password_executor, get_current_admin_user
+from api.server.utils.json_response import FastJSONResponse
+from api.server.exports.pdf import shutdown_pdf_pool
+from api.server.exports.jobs import export_jobs, maintain_export_jobs
+from api.server.database.connection import db_manager, get_tenders_collection
+from api.server.database.indexes import ensure_indexes, explain_hot_queries
+from api.server.database.migrations import (
+    check_typed_dates, typed_dates_state, backfill_on_startup, assign_instance_ids_on_startup
+)
+from api.server.utils.prefix_index import tender_name_index, maintain_prefix_index
+from api.server.stats.rollup import rollup_state, maintain_rollup
+from api.server.stats.cache import stats_cache, current_generation
+from api.server.stats.columnar import columnar_engine, maintain_columnar_snapshot
+
+async def prepare_statistics(db):
+    """Complète les champs dérivés puis construit et surveille le rollup qui les agrège"""
+    await backfill_on_startup(db)
+    await maintain_rollup(db)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connexion à MongoDB, création des index et tâches de fond au démarrage"""
+    await db_manager.connect()
+    await ensure_indexes(db_manager.get_database())
+    await check_typed_dates(db_manager.get_database())
+    await assign_instance_ids_on_startup(db_manager.get_database())
+    background_tasks = [
+        asyncio.create_task(maintain_prefix_index(get_tenders_collection)),
+        asyncio.create_task(prepare_statistics(db_manager.get_database())),
+        asyncio.create_task(maintain_columnar_snapshot(get_tenders_collection)),
+        asyncio.create_task(maintain_export_jobs()),
+    ]
+    yield
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await export_jobs.shutdown()
+    shutdown_pdf_pool()
+    password_executor.shutdown(wait=False, cancel_futures=True)
+    await db_manager.disconnect()
 
 app = FastAPI(
     title="LLAO API",
     description="API pour la gestion et l'analyse d'appels d'offres",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
 )
 
 # Ajout du middleware CORS
@@ -23,6 +67,7 @@ app.add_middleware(
 # Inclusion des routes
 app.include_router(dashboards.router, prefix="/api")
 app.include_router(tenders.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
 
 @app.get("/")
@@ -31,4 +76,42 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "llao-api"} 
\ No newline at end of file
+    return {"status": "healthy", "service": "llao-api"}
+
+# Diagnostics d'exploitation (plans d'exécution, noms d'index, files internes) : administrateurs seulement
+
+@app.get("/health/indexes", dependencies=[Depends(get_current_admin_user)])
+async def health_indexes():
+    """Vérifie via explain() que les requêtes fréquentes utilisent un index"""
+    return await explain_hot_queries(db_manager.get_database())
+
+@app.get("/health/search-index", dependencies=[Depends(get_current_admin_user)])
+async def health_search_index():
+    """État de l'index de saisie semi-automatique (taille, empreinte mémoire, durée de construction)"""
+    return tender_name_index.stats()
+
+@app.get("/health/stats-cache", dependencies=[Depends(get_current_admin_user)])
+async def health_stats_cache():
+    """Compteurs du cache des statistiques, état du rollup et du moteur en colonnes"""
+    return {
+        "generation": current_generation(),
+        **stats_cache.stats(),
+        "typed_dates": typed_dates_state.ready,
+        "rollup": rollup_state.stats(),
+        "columnar": {"enabled": columnar_engine.enabled, **columnar_engine.snapshot.stats()}
+    }
+
+@app.get("/health/export-jobs", dependencies=[Depends(get_current_admin_user)])
+async def health_export_jobs():
+    """Occupation de la file des exports en arrière-plan"""
+    return export_jobs.stats()
+
+@app.get("/health/user-cache", dependencies=[Depends(get_current_admin_user)])
+async def health_user_cache():
+    """Compteurs du cache des utilisateurs authentifiés"""
+    return user_cache.stats()
+
+@app.get("/health/password-hashing", dependencies=[Depends(get_current_admin_user)])
+async def health_password_hashing():
+    """Occupation du pool bcrypt : file d'attente, refus (429), durées de calcul et d'attente"""
+    return password_hashing.stats()
@@ -0,0 +1,77 @@
+import asyncio
+import math
+import sys
+import time
+from typing import List
+
+from api.server.stats.columnar import ColumnarSnapshot
+from api.server.stats.pipelines import STAT_NAMES, STAT_RESULT_LIMIT, build_stat_pipeline
+from api.server.stats.service import StatsFilters
+
+def _kind(value) -> type:
+    # Int64 (entier 64 bits décodé par bson) est un int pour le client JSON
+    if isinstance(value, int) and not isinstance(value, bool):
+        return int
+    return type(value)
+
+def _same(a, b) -> bool:
+    """Égalité des résultats, types compris (1038 et 1038.0 diffèrent), à l'arrondi près des moyennes flottantes"""
+    if _kind(a) is not _kind(b):
+        return False
+    if isinstance(a, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def _canonical(rows: List) -> List:
+    # L'ordre des ex-aequo n'est pas garanti par $sort
+    return sorted(rows, key=lambda r: repr(r["_id"]))
+
+async def run(repeat: int):
+    from dotenv import load_dotenv
+    from api.server.database.connection import db_manager
+
+    load_dotenv(dotenv_path=".env")
+    await db_manager.connect()
+    try:
+        collection = db_manager.get_collection("appels_offres")
+        snapshot = ColumnarSnapshot()
+        await snapshot.load(collection)
+        print(f"Instantané: {snapshot.size} lignes chargées en {snapshot.load_seconds:.3f}s")
+
+        options = await asyncio.gather(*(collection.distinct(dim) for dim in ("categorie", "statut", "pole")))
+        filter_sets = [StatsFilters()]
+        if options[0]:
+            filter_sets.append(StatsFilters(categorie=options[0][0]))
+        if options[2]:
+            filter_sets.append(StatsFilters(pole=options[2][0], date_debut="2023-01-01", date_fin="2023-12-31"))
+
+        print(f"{'statistique':<28}{'filtres':<10}{'mongo (ms)':>12}{'numpy (ms)':>12}{'accélération':>14}  identique")
+        mismatches = 0
+        for name in STAT_NAMES:
+            for i, filters in enumerate(filter_sets):
+                pipeline = build_stat_pipeline(name, filters.to_match())
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    expected = await collection.aggregate(pipeline).to_list(length=STAT_RESULT_LIMIT)
+                mongo_ms = (time.perf_counter() - start) / repeat * 1000
+
+                start = time.perf_counter()
+                for _ in range(repeat):
+                    actual = snapshot.compute(name, filters)
+                numpy_ms = (time.perf_counter() - start) / repeat * 1000
+
+                same = _same(_canonical(expected), _canonical(actual))
+                mismatches += not same
+                speedup = mongo_ms / numpy_ms if numpy_ms else float("inf")
+                print(f"{name:<28}{i:<10}{mongo_ms:>12.2f}{numpy_ms:>12.3f}{speedup:>13.1f}x  {'oui' if same else 'NON'}")
+        return 1 if mismatches else 0
+    finally:
+        await db_manager.disconnect()
+
+if __name__ == "__main__":
+    # python -m api.server.stats.benchmark [répétitions]
+    sys.exit(asyncio.run(run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)))
@@ -0,0 +1,40 @@
+import os
+import time
+import uuid
+
+from api.server.utils.cache import LRUTTLCache
+
+# Résultats des statistiques, par (génération, statistique, filtres normalisés)
+stats_cache = LRUTTLCache(
+    max_entries=int(os.getenv("STATS_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("STATS_CACHE_TTL_SECONDS", "300"))
+)
+
+class TendersGeneration:
+    """Compteur incrémenté à chaque écriture sur appels_offres (propre au processus)"""
+    def __init__(self):
+        self.value = 0
+        # Distingue les compteurs de processus différents (redémarrage, plusieurs workers)
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def bump(self):
+        self.value += 1
+        # Les entrées des générations précédentes ne sont plus atteignables
+        stats_cache.clear()
+
+tenders_generation = TendersGeneration()
+
+def current_generation() -> int:
+    return tenders_generation.value
+
+def bump_generation():
+    tenders_generation.bump()
+
+def generation_token() -> str:
+    """Version des données statistiques servie par ce processus, pour les ETag.
+
+    Inclut la fenêtre de durée de vie du cache : les écritures faites par un autre
+    processus sont prises en compte au même rythme que l'expiration du cache.
+    """
+    window = int(time.time() // stats_cache.ttl_seconds) if stats_cache.ttl_seconds else 0
+    return f"{tenders_generation.epoch}-{tenders_generation.value}-{window}"
@@ -0,0 +1,387 @@
+import asyncio
+import bisect
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from api.server.stats.cache import current_generation
+from api.server.stats.pipelines import METRIC_STATS, STAT_RESULT_LIMIT
+from api.server.utils.data_helpers import modified_since
+
+DIMENSIONS = ("categorie", "pole", "statut")
+NUMERIC_FIELDS = ("delai_jours", "note_technique", "prix_client", "ecart_prix", "ecart_score", "ratio_prix")
+PROJECTION = {field: 1 for field in DIMENSIONS + NUMERIC_FIELDS + ("date_emission",)}
+LOAD_BATCH_SIZE = 5000
+# Au-delà, un rafraîchissement recharge l'instantané complet hors de la boucle d'événements
+REFRESH_IN_PLACE_MAX = 5000
+
+class Dictionary:
+    """Encodage par dictionnaire d'une colonne de valeurs (None compris)"""
+    def __init__(self):
+        self.values: List = []
+        self._codes: Dict = {}
+
+    def encode(self, value) -> int:
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code_of(self, value) -> Optional[int]:
+        return self._codes.get(value)
+
+def _number(value) -> float:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
+
+def _is_integer(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _sorted_desc(rows: List[Dict], field: str) -> List[Dict]:
+    """Tri décroissant comme $sort: {field: -1} (les null en dernier)"""
+    present = sorted((r for r in rows if r[field] is not None), key=lambda r: r[field], reverse=True)
+    return present + [r for r in rows if r[field] is None]
+
+class ColumnarSnapshot:
+    """Instantané en colonnes d'appels_offres pour calculer les statistiques par masques vectorisés.
+
+    Les dimensions sont encodées par dictionnaire, date_emission par un dictionnaire trié
+    (comparaisons de chaînes sur les codes) d'où dérive la colonne entière des mois, et
+    les champs numériques sont des float64 (NaN pour les valeurs absentes). Une colonne
+    booléenne par champ numérique retient les valeurs stockées en entier, pour renvoyer
+    des min/max du même type que MongoDB.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._capacity = 0
+        self._rows: Dict = {}
+        self._dims = {dim: Dictionary() for dim in DIMENSIONS}
+        self._dim_codes: Dict[str, np.ndarray] = {}
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._integer: Dict[str, np.ndarray] = {}
+        self._live = np.zeros(0, dtype=bool)
+        # Dictionnaire trié des dates ; -1 pour une date qui n'est pas une chaîne
+        self._dates: List[str] = []
+        self._date_codes = np.zeros(0, dtype=np.int32)
+        self._month_of_date = np.zeros(0, dtype=np.int32)
+        self._months: List[str] = []
+        self.last_sync: Optional[datetime] = None
+        self.synced_generation: Optional[int] = None
+        self.ready = False
+        self.load_seconds: Optional[float] = None
+        self._loaded_clock: Optional[float] = None
+
+    # Chargement
+
+    def _reserve(self, capacity: int):
+        if capacity <= self._capacity:
+            return
+        capacity = max(capacity, self._capacity * 2, 1024)
+
+        def grow(array, fill, dtype):
+            grown = np.full(capacity, fill, dtype=dtype)
+            grown[:self.size] = array[:self.size]
+            return grown
+
+        self._dim_codes = {dim: grow(self._dim_codes.get(dim, np.zeros(0)), 0, np.int32) for dim in DIMENSIONS}
+        self._numeric = {
+            field: grow(self._numeric.get(field, np.zeros(0)), np.nan, np.float64) for field in NUMERIC_FIELDS
+        }
+        self._integer = {
+            field: grow(self._integer.get(field, np.zeros(0, dtype=bool)), False, bool) for field in NUMERIC_FIELDS
+        }
+        self._date_codes = grow(self._date_codes, -1, np.int32)
+        self._live = grow(self._live, False, bool)
+        self._capacity = capacity
+
+    def _recode_dates(self, new_values: List[str]):
+        """Ajoute des dates au dictionnaire trié et renumérote les codes existants"""
+        merged = sorted(set(self._dates).union(new_values))
+        if len(merged) == len(self._dates):
+            return
+        remap = np.array([bisect.bisect_left(merged, d) for d in self._dates], dtype=np.int32)
+        codes = self._date_codes[:self.size]
+        valid = codes >= 0
+        codes[valid] = remap[codes[valid]]
+        self._dates = merged
+        months = Dictionary()
+        for month in self._months:
+            months.encode(month)
+        self._month_of_date = np.array([months.encode(d[:7]) for d in merged], dtype=np.int32)
+        self._months = months.values
+
+    def _write_rows(self, docs: List[Dict]):
+        """Insère ou remplace des lignes (par _id)"""
+        self._recode_dates([d["date_emission"] for d in docs if isinstance(d.get("date_emission"), str)])
+        self._reserve(self.size + len(docs))
+        for doc in docs:
+            row = self._rows.get(doc["_id"])
+            if row is None:
+                row = self.size
+                self._rows[doc["_id"]] = row
+                self.size += 1
+            for dim in DIMENSIONS:
+                self._dim_codes[dim][row] = self._dims[dim].encode(doc.get(dim))
+            for field in NUMERIC_FIELDS:
+                value = doc.get(field)
+                self._numeric[field][row] = _number(value)
+                self._integer[field][row] = _is_integer(value)
+            date_emission = doc.get("date_emission")
+            self._date_codes[row] = (
+                bisect.bisect_left(self._dates, date_emission) if isinstance(date_emission, str) else -1
+            )
+            self._live[row] = True
+
+    async def load(self, collection):
+        """Charge l'instantané complet.
+
+        Les lots sont encodés dans le pool de threads sur un instantané neuf, qui remplace
+        l'actuel en une fois : les statistiques continuent d'utiliser l'ancien entre-temps.
+        """
+        start = time.perf_counter()
+        # Filigrane pris avant le parcours : une écriture faite pendant sera relue au rafraîchissement
+        started_at = datetime.utcnow()
+        generation = current_generation()
+        fresh = ColumnarSnapshot()
+        batch = []
+        async for doc in collection.find({}, PROJECTION).batch_size(LOAD_BATCH_SIZE):
+            batch.append(doc)
+            if len(batch) >= LOAD_BATCH_SIZE:
+                await run_in_threadpool(fresh._write_rows, batch)
+                batch = []
+        if batch:
+            await run_in_threadpool(fresh._write_rows, batch)
+        fresh.ready = True
+        fresh.last_sync = started_at
+        fresh.synced_generation = generation
+        fresh.load_seconds = time.perf_counter() - start
+        fresh._loaded_clock = time.monotonic()
+        self.__dict__.update(fresh.__dict__)
+
+    async def refresh(self, collection) -> int:
+        """Intègre les documents modifiés depuis la dernière synchronisation (via date_maj)"""
+        if not self.ready:
+            await self.load(collection)
+            return self.size
+        started_at = datetime.utcnow()
+        generation = current_generation()
+        docs = await collection.find(modified_since(self.last_sync), PROJECTION).to_list(
+            length=REFRESH_IN_PLACE_MAX + 1
+        )
+        if len(docs) > REFRESH_IN_PLACE_MAX:
+            # Ex: après un import en masse ; l'écriture en place bloquerait la boucle d'événements
+            await self.load(collection)
+            return self.size
+        if docs:
+            self._write_rows(docs)
+        self.last_sync = started_at
+        self.synced_generation = generation
+        return len(docs)
+
+    def age_seconds(self) -> Optional[float]:
+        if self._loaded_clock is None:
+            return None
+        return time.monotonic() - self._loaded_clock
+
+    # Calcul
+
+    def _mask(self, filters) -> np.ndarray:
+        n = self.size
+        mask = self._live[:n].copy()
+        for dim in DIMENSIONS:
+            value = getattr(filters, dim)
+            if not value:
+                continue
+            values = value if isinstance(value, tuple) else (value,)
+            codes = [c for c in (self._dims[dim].code_of(v) for v in values) if c is not None]
+            if not codes:
+                return np.zeros(n, dtype=bool)
+            if len(codes) == 1:
+                mask &= self._dim_codes[dim][:n] == codes[0]
+            else:
+                mask &= np.isin(self._dim_codes[dim][:n], codes)
+        if filters.date_debut or filters.date_fin:
+            codes = self._date_codes[:n]
+            mask &= codes >= 0
+            if filters.date_debut:
+                mask &= codes >= bisect.bisect_left(self._dates, filters.date_debut)
+            if filters.date_fin:
+                mask &= codes < bisect.bisect_right(self._dates, filters.date_fin)
+        return mask
+
+    def _win_loss(self, mask) -> List[Dict]:
+        statut = self._dim_codes["statut"][:self.size][mask]
+        counts = np.bincount(statut, minlength=len(self._dims["statut"].values))
+        rows = [
+            {"_id": self._dims["statut"].values[code], "count": int(count)}
+            for code, count in enumerate(counts) if count
+        ]
+        return _sorted_desc(rows, "count")
+
+    def _evolution(self, mask) -> List[Dict]:
+        date_codes = self._date_codes[:self.size][mask]
+        statut = self._dim_codes["statut"][:self.size][mask]
+        n_months = len(self._months)
+        # Les dates non textuelles donnent un mois vide, comme $substr
+        months = np.where(date_codes >= 0, self._month_of_date[np.maximum(date_codes, 0)], n_months)
+        n_statut = len(self._dims["statut"].values)
+        counts = np.bincount(months * n_statut + statut, minlength=(n_months + 1) * n_statut)
+        rows = []
+        for key in np.nonzero(counts)[0]:
+            month_code, statut_code = divmod(int(key), n_statut)
+            mois = self._months[month_code] if month_code < n_months else ""
+            rows.append({
+                "_id": {
+                    "mois": mois,
+                    "annee": mois[0:4],
+                    "mois_num": mois[5:7],
+                    "statut": self._dims["statut"].values[statut_code]
+                },
+                "count": int(counts[key])
+            })
+        rows.sort(key=lambda r: (r["_id"]["annee"], r["_id"]["mois_num"]))
+        return rows
+
+    def _success_rate(self, mask) -> List[Dict]:
+        categorie = self._dim_codes["categorie"][:self.size][mask]
+        statut = self._dim_codes["statut"][:self.size][mask]
+        n_cat = len(self._dims["categorie"].values)
+        total = np.bincount(categorie, minlength=n_cat)
+        won_code = self._dims["statut"].code_of("Gagné")
+        if won_code is None:
+            won = np.zeros(n_cat, dtype=np.int64)
+        else:
+            won = np.bincount(categorie[statut == won_code], minlength=n_cat)
+        rows = [
+            {
+                "_id": self._dims["categorie"].values[code],
+                "total": int(total[code]),
+                "gagne": int(won[code]),
+                "taux_succes": int(won[code]) / int(total[code]) * 100
+            }
+            for code in np.nonzero(total)[0]
+        ]
+        return _sorted_desc(rows, "taux_succes")
+
+    def _metric_stat(self, name: str, mask) -> List[Dict]:
+        categorie = self._dim_codes["categorie"][:self.size][mask]
+        n_cat = len(self._dims["categorie"].values)
+        count = np.bincount(categorie, minlength=n_cat)
+        groups = np.nonzero(count)[0]
+        columns = {}
+        for output, op, field in METRIC_STATS[name]:
+            values = self._numeric[field][:self.size][mask]
+            valid = ~np.isnan(values)
+            cats, vals = categorie[valid], values[valid]
+            n = np.bincount(cats, minlength=n_cat)
+            if op == "avg":
+                sums = np.bincount(cats, weights=vals, minlength=n_cat)
+                columns[output] = [float(sums[g] / n[g]) if n[g] else None for g in groups]
+            else:
+                reduced = np.full(n_cat, np.inf if op == "min" else -np.inf)
+                (np.minimum if op == "min" else np.maximum).at(reduced, cats, vals)
+                # Entier si la valeur retenue est stockée en entier dans MongoDB
+                integer = self._integer[field][:self.size][mask][valid]
+                is_int = np.bincount(cats[integer & (vals == reduced[cats])], minlength=n_cat) > 0
+                columns[output] = [
+                    (int if is_int[g] else float)(reduced[g]) if n[g] else None for g in groups
+                ]
+        rows = []
+        for i, g in enumerate(groups):
+            row = {"_id": self._dims["categorie"].values[g]}
+            for output, _, _ in METRIC_STATS[name]:
+                row[output] = columns[output][i]
+            row["count"] = int(count[g])
+            rows.append(row)
+        return _sorted_desc(rows, METRIC_STATS[name][0][0])
+
+    def compute(self, name: str, filters) -> List[Dict]:
+        """Calcule une statistique avec les mêmes résultats que le pipeline MongoDB"""
+        mask = self._mask(filters)
+        if name == "win-loss":
+            rows = self._win_loss(mask)
+        elif name == "win-loss-evolution-month":
+            rows = self._evolution(mask)
+        elif name == "success-rate-by-category":
+            rows = self._success_rate(mask)
+        else:
+            rows = self._metric_stat(name, mask)
+        return rows[:STAT_RESULT_LIMIT]
+
+    def values(self, field: str, filters, group_by: Optional[str] = None) -> Dict:
+        """Valeurs numériques (non nulles) d'un champ, groupées par dimension si demandé"""
+        mask = self._mask(filters)
+        values = self._numeric[field][:self.size]
+        mask &= ~np.isnan(values)
+        if not group_by:
+            return {None: values[mask]} if mask.any() else {}
+        codes = self._dim_codes[group_by][:self.size][mask]
+        selected = values[mask]
+        return {
+            self._dims[group_by].values[code]: selected[codes == code]
+            for code in np.unique(codes)
+        }
+
+    def invalidate(self):
+        """Force un rechargement complet au prochain cycle (écritures faites sans date_maj)"""
+        self.ready = False
+
+    def usable(self) -> bool:
+        """Utilisable seulement s'il reflète toutes les écritures connues de ce processus"""
+        return self.ready and self.synced_generation == current_generation()
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "rows": self.size,
+            "memory_bytes": int(
+                sum(a.nbytes for a in self._dim_codes.values())
+                + sum(a.nbytes for a in self._numeric.values())
+                + self._date_codes.nbytes + self._live.nbytes
+            ),
+            "load_seconds": self.load_seconds,
+            "synced_generation": self.synced_generation,
+            "last_sync": self.last_sync.isoformat() if self.last_sync else None,
+        }
+
+class ColumnarEngine:
+    """Moteur de statistiques en mémoire, activé par STATS_ENGINE=columnar"""
+    def __init__(self):
+        self.enabled = os.getenv("STATS_ENGINE", "mongo") == "columnar"
+        self.snapshot = ColumnarSnapshot()
+
+    def usable(self) -> bool:
+        return self.enabled and self.snapshot.usable()
+
+    def compute(self, names: List[str], filters) -> Dict[str, List[Dict]]:
+        return {name: self.snapshot.compute(name, filters) for name in names}
+
+columnar_engine = ColumnarEngine()
+
+async def maintain_columnar_snapshot(get_collection):
+    """Tâche de fond : chargement initial, rafraîchissement incrémental et rechargement périodique"""
+    if not columnar_engine.enabled:
+        return
+    refresh_seconds = float(os.getenv("STATS_COLUMNAR_REFRESH_SECONDS", "10"))
+    reload_seconds = float(os.getenv("STATS_COLUMNAR_RELOAD_SECONDS", "3600"))
+    snapshot = columnar_engine.snapshot
+    while True:
+        try:
+            collection = await get_collection()
+            if not snapshot.ready or snapshot.age_seconds() > reload_seconds:
+                await snapshot.load(collection)
+            else:
+                await snapshot.refresh(collection)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Instantané statistique non rafraîchi: {e}")
+        await asyncio.sleep(refresh_seconds)
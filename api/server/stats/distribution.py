@@ -0,0 +1,96 @@
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from api.server.stats.cache import stats_cache, current_generation
+from api.server.stats.columnar import columnar_engine, NUMERIC_FIELDS as COLUMNAR_FIELDS
+
+# Champs numériques dont on peut demander la distribution
+DISTRIBUTION_FIELDS = (
+    "delai_jours", "note_technique", "note_prix", "prix_client", "prix_gagnant",
+    "score_client", "score_gagnant", "ecart_prix", "ecart_score", "ratio_prix", "ratio_score"
+)
+GROUP_BY_FIELDS = ("categorie", "pole", "statut")
+# Nombre maximal de valeurs aberrantes renvoyées par groupe (le total est toujours indiqué)
+MAX_OUTLIERS = 50
+
+def summarize(values: np.ndarray, bins: int, quantiles: List[float]) -> Dict:
+    """Boîte à moustaches (Tukey, 1,5 × IQR), histogramme et quantiles d'une série"""
+    count = int(values.size)
+    if count == 0:
+        return {"count": 0}
+    values = np.sort(values)
+    q1, median, q3 = (float(v) for v in np.percentile(values, [25, 50, 75]))
+    iqr = q3 - q1
+    low_fence, high_fence = q1 - 1.5 * iqr, q3 + 1.5 * iqr
+    inside = values[(values >= low_fence) & (values <= high_fence)]
+    outliers = values[(values < low_fence) | (values > high_fence)]
+    # On garde les valeurs les plus extrêmes des deux côtés
+    if outliers.size > MAX_OUTLIERS:
+        half = MAX_OUTLIERS // 2
+        shown = np.concatenate([outliers[:half], outliers[-(MAX_OUTLIERS - half):]])
+    else:
+        shown = outliers
+    counts, edges = np.histogram(values, bins=bins)
+    result = {
+        "count": count,
+        "min": float(values[0]),
+        "max": float(values[-1]),
+        "mean": float(values.mean()),
+        "q1": q1,
+        "median": median,
+        "q3": q3,
+        "whisker_low": float(inside[0]) if inside.size else q1,
+        "whisker_high": float(inside[-1]) if inside.size else q3,
+        "outlier_count": int(outliers.size),
+        "outliers": [float(v) for v in shown],
+        "histogram": {"edges": [float(e) for e in edges], "counts": [int(c) for c in counts]},
+    }
+    if quantiles:
+        result["quantiles"] = {str(q): float(v) for q, v in zip(quantiles, np.quantile(values, quantiles))}
+    return result
+
+async def _load_values(collection, field: str, group_by: Optional[str], match: Dict) -> Dict:
+    """Lit uniquement le champ (et la dimension) demandés, par lots"""
+    query = {**match, field: {"$type": "number"}}
+    projection = {"_id": 0, field: 1}
+    if group_by:
+        projection[group_by] = 1
+    groups: Dict = {}
+    async for doc in collection.find(query, projection).batch_size(10000):
+        key = doc.get(group_by) if group_by else None
+        groups.setdefault(key, array("d")).append(doc[field])
+    return {key: np.frombuffer(values, dtype=np.float64) for key, values in groups.items()}
+
+async def compute_distribution(
+    collection,
+    field: str,
+    filters,
+    bins: int = 20,
+    quantiles: Optional[List[float]] = None,
+    group_by: Optional[str] = None
+) -> Dict:
+    """Distribution d'un champ numérique, globale ou par dimension"""
+    filters = filters.normalized()
+    quantiles = quantiles or []
+    key = (current_generation(), "distribution", field, bins, tuple(quantiles), group_by, filters)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+
+    if columnar_engine.usable() and field in COLUMNAR_FIELDS:
+        groups = columnar_engine.snapshot.values(field, filters, group_by)
+    else:
+        groups = await _load_values(collection, field, group_by, filters.to_match())
+
+    def summarize_groups():
+        return [
+            {"_id": group, **summarize(values, bins, quantiles)}
+            for group, values in sorted(groups.items(), key=lambda item: (item[0] is None, str(item[0])))
+        ]
+
+    result = {"field": field, "group_by": group_by, "groups": await run_in_threadpool(summarize_groups)}
+    stats_cache.set(key, result)
+    return result
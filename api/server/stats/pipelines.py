@@ -0,0 +1,207 @@
+from typing import Dict, List
+
+# Nombre maximal de lignes renvoyées par statistique
+STAT_RESULT_LIMIT = 100
+
+# Étapes d'agrégation de chaque statistique, appliquées après le $match des filtres
+STAT_PIPELINES: Dict[str, List[Dict]] = {
+    "win-loss": [
+        {
+            "$group": {
+                "_id": "$statut",
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"count": -1}}
+    ],
+    "win-loss-evolution-month": [
+        {
+            "$addFields": {
+                "mois": {"$substr": ["$date_emission", 0, 7]},
+                "annee": {"$substr": ["$date_emission", 0, 4]},
+                "mois_num": {"$substr": ["$date_emission", 5, 2]}
+            }
+        },
+        {
+            "$group": {
+                "_id": {
+                    "mois": "$mois",
+                    "annee": "$annee",
+                    "mois_num": "$mois_num",
+                    "statut": "$statut"
+                },
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"_id.annee": 1, "_id.mois_num": 1}}
+    ],
+    "success-rate-by-category": [
+        {
+            "$group": {
+                "_id": {
+                    "categorie": "$categorie",
+                    "statut": "$statut"
+                },
+                "count": {"$sum": 1}
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.categorie",
+                "total": {"$sum": "$count"},
+                "gagne": {
+                    "$sum": {
+                        "$cond": [
+                            {"$eq": ["$_id.statut", "Gagné"]},
+                            "$count",
+                            0
+                        ]
+                    }
+                }
+            }
+        },
+        {
+            "$addFields": {
+                "taux_succes": {
+                    "$multiply": [
+                        {"$divide": ["$gagne", "$total"]},
+                        100
+                    ]
+                }
+            }
+        },
+        {"$sort": {"taux_succes": -1}}
+    ],
+    "delays": [
+        {
+            "$group": {
+                "_id": "$categorie",
+                "delai_moyen": {"$avg": "$delai_jours"},
+                "delai_min": {"$min": "$delai_jours"},
+                "delai_max": {"$max": "$delai_jours"},
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"delai_moyen": -1}}
+    ],
+    "scores": [
+        {
+            "$group": {
+                "_id": "$categorie",
+                "note_moyenne": {"$avg": "$note_technique"},
+                "note_min": {"$min": "$note_technique"},
+                "note_max": {"$max": "$note_technique"},
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"note_moyenne": -1}}
+    ],
+    "pricing": [
+        {
+            "$group": {
+                "_id": "$categorie",
+                "prix_moyen": {"$avg": "$prix_client"},
+                "prix_min": {"$min": "$prix_client"},
+                "prix_max": {"$max": "$prix_client"},
+                "ecart_prix_moyen": {"$avg": "$ecart_prix"},
+                "ratio_prix_moyen": {"$avg": "$ratio_prix"},
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"prix_moyen": -1}}
+    ],
+    "comparison": [
+        {
+            "$group": {
+                "_id": "$categorie",
+                "ecart_score_moyen": {"$avg": "$ecart_score"},
+                "ecart_score_min": {"$min": "$ecart_score"},
+                "ecart_score_max": {"$max": "$ecart_score"},
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"ecart_score_moyen": -1}}
+    ],
+}
+
+STAT_NAMES = tuple(STAT_PIPELINES)
+
+# Statistiques par catégorie sur des champs numériques : [(champ de sortie, opération, champ source)]
+METRIC_STATS: Dict[str, List[tuple]] = {
+    "delays": [
+        ("delai_moyen", "avg", "delai_jours"),
+        ("delai_min", "min", "delai_jours"),
+        ("delai_max", "max", "delai_jours"),
+    ],
+    "scores": [
+        ("note_moyenne", "avg", "note_technique"),
+        ("note_min", "min", "note_technique"),
+        ("note_max", "max", "note_technique"),
+    ],
+    "pricing": [
+        ("prix_moyen", "avg", "prix_client"),
+        ("prix_min", "min", "prix_client"),
+        ("prix_max", "max", "prix_client"),
+        ("ecart_prix_moyen", "avg", "ecart_prix"),
+        ("ratio_prix_moyen", "avg", "ratio_prix"),
+    ],
+    "comparison": [
+        ("ecart_score_moyen", "avg", "ecart_score"),
+        ("ecart_score_min", "min", "ecart_score"),
+        ("ecart_score_max", "max", "ecart_score"),
+    ],
+}
+
+def stat_sort(name: str) -> Dict:
+    """Étape $sort finale d'une statistique"""
+    return STAT_PIPELINES[name][-1]["$sort"]
+
+def build_stat_pipeline(name: str, match: Dict) -> List[Dict]:
+    """Pipeline complet d'une statistique"""
+    return [{"$match": match}] + STAT_PIPELINES[name]
+
+def build_bundle_pipeline(names: List[str], match: Dict) -> List[Dict]:
+    """Pipeline unique calculant plusieurs statistiques en un seul parcours via $facet"""
+    return [
+        {"$match": match},
+        {"$facet": {name: STAT_PIPELINES[name] + [{"$limit": STAT_RESULT_LIMIT}] for name in names}}
+    ]
+
+# Granularités de l'évolution par période ($dateTrunc, MongoDB 5.0+)
+EVOLUTION_GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+def build_evolution_pipeline(match: Dict, granularity: str, timezone: str, typed_dates: bool) -> List[Dict]:
+    """Évolution gagné/perdu regroupée par période calendaire dans un fuseau horaire.
+
+    Sans dates typées, la date est convertie à la volée depuis la chaîne date_emission ;
+    avec, cette conversion reste le repli des documents écrits hors API sans date_emission_dt.
+    Une date sans heure (AAAA-MM-JJ, stockée à minuit UTC) est une date calendaire : elle est
+    tronquée en UTC pour rester dans sa période quel que soit le fuseau demandé.
+    """
+    parsed = {"$dateFromString": {"dateString": "$date_emission", "onError": None, "onNull": None}}
+    date = {"$ifNull": ["$date_emission_dt", parsed]} if typed_dates else parsed
+    date_only = {
+        "$cond": [
+            {"$eq": [{"$type": "$date_emission"}, "string"]},
+            {"$eq": [{"$strLenCP": "$date_emission"}, 10]},
+            False
+        ]
+    }
+    trunc = {"date": "$date", "unit": granularity, "timezone": "$fuseau"}
+    if granularity == "week":
+        trunc["startOfWeek"] = "monday"
+    return [
+        {"$match": match},
+        {"$project": {"statut": 1, "date": date, "fuseau": {"$cond": [date_only, "UTC", timezone]}}},
+        {"$project": {"statut": 1, "fuseau": 1, "periode": {"$dateTrunc": trunc}}},
+        {
+            "$group": {
+                "_id": {
+                    "periode": {"$dateToString": {"date": "$periode", "format": "%Y-%m-%d", "timezone": "$fuseau"}},
+                    "statut": "$statut"
+                },
+                "count": {"$sum": 1}
+            }
+        },
+        {"$sort": {"_id.periode": 1, "_id.statut": 1}}
+    ]
@@ -0,0 +1,387 @@
+import asyncio
+import calendar
+import os
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from api.server.stats.cache import bump_generation
+from api.server.stats.pipelines import STAT_PIPELINES, STAT_RESULT_LIMIT, METRIC_STATS, stat_sort
+
+# Agrégats mensuels par (mois, categorie, pole, statut)
+ROLLUP_COLLECTION = "stats_rollup_mensuel"
+META_COLLECTION = "stats_meta"
+ROLLUP_METRICS = ("delai_jours", "note_technique", "prix_client", "ecart_prix", "ecart_score", "ratio_prix")
+DIMENSIONS = ("categorie", "pole", "statut")
+
+MONTH_START_RE = re.compile(r"^\d{4}-\d{2}(-01)?$")
+DAY_RE = re.compile(r"^(\d{4})-(\d{2})-(\d{2})$")
+
+class RollupState:
+    """État du rollup dans ce processus.
+
+    `ready` autorise la lecture du rollup ; les écritures de l'API le tiennent à jour
+    dès qu'il a été construit (`built_at`), ou sont mises en file pendant une reconstruction.
+    """
+    def __init__(self):
+        self.enabled = os.getenv("STATS_ROLLUP_ENABLED", "1") == "1"
+        self.ready = False
+        self.built_at: Optional[datetime] = None
+        self.rebuilding = False
+        # Plus grand _id d'appels_offres connu du rollup (reconstruction ou écriture de l'API)
+        self.max_id = None
+        self.checked_at: Optional[datetime] = None
+        self.drift: Optional[str] = None
+        # Clés des agrégats écrits pendant une reconstruction, rejouées après $out
+        self.pending: List[Dict] = []
+        self._lock: Optional[asyncio.Lock] = None
+
+    def lock(self) -> asyncio.Lock:
+        # Créé à la première utilisation, dans la boucle d'événements du serveur
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @property
+    def tracking(self) -> bool:
+        """Les écritures doivent être reportées sur le rollup (directement ou via la file)"""
+        return self.rebuilding or self.built_at is not None
+
+    def defer(self, keys: Iterable[Dict]):
+        """Met en file des agrégats écrits pendant une reconstruction.
+
+        Le rollup n'est plus lu jusqu'à leur recalcul : les statistiques passent
+        par les documents bruts plutôt que de manquer ces écritures.
+        """
+        self.pending.extend(keys)
+        self.ready = False
+
+    def note_insert(self, tender_id):
+        try:
+            if self.max_id is None or tender_id > self.max_id:
+                self.max_id = tender_id
+        except TypeError:
+            # _id de types différents : la prochaine vérification tranchera
+            pass
+
+    def age_seconds(self) -> float:
+        if self.built_at is None:
+            return float("inf")
+        return (datetime.utcnow() - self.built_at).total_seconds()
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "ready": self.ready,
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "checked_at": self.checked_at.isoformat() if self.checked_at else None,
+            "last_drift": self.drift,
+            "pending": len(self.pending),
+        }
+
+rollup_state = RollupState()
+
+# Construction
+
+def _month_expr():
+    """Mois (AAAA-MM) de date_emission, None si la date n'est pas une chaîne"""
+    return {
+        "$cond": [
+            {"$eq": [{"$type": "$date_emission"}, "string"]},
+            {"$substr": ["$date_emission", 0, 7]},
+            None
+        ]
+    }
+
+def _rollup_group_stage() -> Dict:
+    group = {
+        "_id": {
+            "mois": _month_expr(),
+            "categorie": {"$ifNull": ["$categorie", None]},
+            "pole": {"$ifNull": ["$pole", None]},
+            "statut": {"$ifNull": ["$statut", None]},
+        },
+        "count": {"$sum": 1},
+    }
+    for metric in ROLLUP_METRICS:
+        # Comme $avg, on ne compte que les valeurs numériques
+        group[f"{metric}_n"] = {"$sum": {"$cond": [{"$isNumber": f"${metric}"}, 1, 0]}}
+        group[f"{metric}_sum"] = {"$sum": f"${metric}"}
+        group[f"{metric}_min"] = {"$min": f"${metric}"}
+        group[f"{metric}_max"] = {"$max": f"${metric}"}
+    return {"$group": group}
+
+def rollup_key(doc: Dict) -> Dict:
+    """Clé du rollup d'un appel d'offres (même ordre de champs que l'agrégation)"""
+    date_emission = doc.get("date_emission")
+    return {
+        "mois": date_emission[:7] if isinstance(date_emission, str) else None,
+        "categorie": doc.get("categorie"),
+        "pole": doc.get("pole"),
+        "statut": doc.get("statut"),
+    }
+
+def _bucket_match(key: Dict) -> Dict:
+    """Filtre des appels d'offres appartenant à un agrégat"""
+    match = {dim: key[dim] for dim in DIMENSIONS}
+    if key["mois"] is None:
+        match["date_emission"] = {"$not": {"$type": "string"}}
+    else:
+        match["date_emission"] = {"$gte": key["mois"], "$lt": key["mois"] + "\uffff"}
+    return match
+
+async def _source_max_id(db):
+    last = await db["appels_offres"].find({}, {"_id": 1}).sort("_id", -1).limit(1).to_list(length=1)
+    return last[0]["_id"] if last else None
+
+async def rebuild_rollup(db):
+    """Reconstruit entièrement le rollup depuis appels_offres.
+
+    Les reconstructions sont sérialisées. Une écriture de l'API pendant l'agrégation
+    serait écrasée par $out : ses agrégats sont mis en file puis recalculés ensuite.
+    """
+    async with rollup_state.lock():
+        rollup_state.rebuilding = True
+        try:
+            started_at = datetime.utcnow()
+            # Lu avant l'agrégation : une insertion concurrente provoquera au pire une reconstruction de plus
+            max_id = await _source_max_id(db)
+            await db["appels_offres"].aggregate(
+                [_rollup_group_stage(), {"$out": ROLLUP_COLLECTION}]
+            ).to_list(length=None)
+            await db[META_COLLECTION].update_one(
+                {"_id": "rollup"},
+                {"$set": {"built_at": started_at}},
+                upsert=True
+            )
+            rollup_state.built_at = started_at
+            rollup_state.max_id = max_id
+        finally:
+            pending, rollup_state.pending = rollup_state.pending, []
+            rollup_state.rebuilding = False
+        # Les écritures arrivées à partir d'ici s'appliquent directement au nouveau rollup
+        if pending:
+            await refresh_rollup_buckets(db, pending)
+        rollup_state.ready = True
+    bump_generation()
+
+async def refresh_rollup_buckets(db, keys: Iterable[Dict]):
+    """Recalcule les agrégats donnés depuis les documents sources"""
+    rollup = db[ROLLUP_COLLECTION]
+    seen = set()
+    for key in keys:
+        marker = tuple(key[k] for k in ("mois",) + DIMENSIONS)
+        if marker in seen:
+            continue
+        seen.add(marker)
+        rows = await db["appels_offres"].aggregate(
+            [{"$match": _bucket_match(key)}, _rollup_group_stage()]
+        ).to_list(length=None)
+        if rows:
+            row = rows[0]
+            row["_id"] = key
+            await rollup.replace_one({"_id": key}, row, upsert=True)
+        else:
+            await rollup.delete_one({"_id": key})
+
+async def apply_tender_write(db, before: Optional[Dict], after: Optional[Dict]):
+    """Met à jour le rollup et invalide le cache des statistiques après l'écriture d'un appel d'offres.
+
+    Une insertion est appliquée par $inc/$min/$max ; une modification ou une suppression
+    recalcule les agrégats concernés (les min/max ne peuvent pas être décrémentés).
+    """
+    bump_generation()
+    if rollup_state.rebuilding:
+        rollup_state.defer(rollup_key(doc) for doc in (before, after) if doc is not None)
+        return
+    if rollup_state.built_at is None:
+        return
+    if before is None and after is not None:
+        rollup_state.note_insert(after.get("_id"))
+        inc = {"count": 1}
+        mins, maxs = {}, {}
+        for metric in ROLLUP_METRICS:
+            value = after.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                inc[f"{metric}_n"] = 1
+                inc[f"{metric}_sum"] = value
+                mins[f"{metric}_min"] = value
+                maxs[f"{metric}_max"] = value
+        update = {"$inc": inc}
+        if mins:
+            update["$min"] = mins
+            update["$max"] = maxs
+        await db[ROLLUP_COLLECTION].update_one({"_id": rollup_key(after)}, update, upsert=True)
+        return
+    keys = [rollup_key(doc) for doc in (before, after) if doc is not None]
+    await refresh_rollup_buckets(db, keys)
+
+async def apply_bulk_write(db, keys: Optional[List[Dict]]):
+    """Reporte un import en masse sur le rollup : agrégats touchés, ou reconstruction si `keys` est None"""
+    if keys is None:
+        if rollup_state.tracking:
+            await rebuild_rollup(db)
+    elif rollup_state.rebuilding:
+        rollup_state.defer(keys)
+    elif rollup_state.built_at is not None:
+        await refresh_rollup_buckets(db, keys)
+        # Les _id des documents insérés par upsert ne sont pas connus un à un
+        rollup_state.note_insert(await _source_max_id(db))
+    bump_generation()
+
+async def rollup_drift(db) -> Optional[str]:
+    """Motif de reconstruction si appels_offres a été modifié hors API (Compass, mongoimport...), sinon None.
+
+    Compare le nombre de documents à la somme des agrégats et le plus grand _id à celui
+    connu du rollup ; les modifications en place hors API ne sont rattrapées que par
+    la reconstruction périodique.
+    """
+    collection = db["appels_offres"]
+    count = await collection.estimated_document_count()
+    rows = await db[ROLLUP_COLLECTION].aggregate(
+        [{"$group": {"_id": None, "count": {"$sum": "$count"}}}]
+    ).to_list(length=1)
+    rollup_count = rows[0]["count"] if rows else 0
+    if count != rollup_count:
+        return f"{count} documents, {rollup_count} dans le rollup"
+    max_id = await _source_max_id(db)
+    if max_id != rollup_state.max_id:
+        return "documents ajoutés hors API"
+    return None
+
+async def maintain_rollup(db):
+    """Tâche de fond : construction initiale, détection des écritures hors API et reconstruction périodique"""
+    if not rollup_state.enabled:
+        return
+    check_seconds = float(os.getenv("STATS_ROLLUP_CHECK_SECONDS", "60"))
+    rebuild_seconds = float(os.getenv("STATS_ROLLUP_REBUILD_SECONDS", "3600"))
+    while True:
+        try:
+            if rollup_state.built_at is None or rollup_state.age_seconds() > rebuild_seconds:
+                await rebuild_rollup(db)
+            elif not rollup_state.rebuilding:
+                drift = await rollup_drift(db)
+                rollup_state.checked_at = datetime.utcnow()
+                if drift:
+                    rollup_state.drift = drift
+                    print(f"⚠️ Rollup statistique désynchronisé ({drift}), reconstruction")
+                    await rebuild_rollup(db)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Rollup statistique non construit, lecture des documents bruts: {e}")
+        await asyncio.sleep(check_seconds)
+
+# Lecture
+
+def _last_day_of_month(value: str) -> bool:
+    match = DAY_RE.match(value)
+    if not match:
+        return False
+    year, month, day = (int(part) for part in match.groups())
+    return 1 <= month <= 12 and day == calendar.monthrange(year, month)[1]
+
+def rollup_match(filters) -> Optional[Dict]:
+    """Filtre équivalent sur le rollup, ou None si les filtres ne s'alignent pas sur des mois entiers"""
+    match = {}
+    for dim in DIMENSIONS:
+        value = getattr(filters, dim)
+        if isinstance(value, tuple):
+            match[f"_id.{dim}"] = {"$in": list(value)}
+        elif value:
+            match[f"_id.{dim}"] = value
+    months = {}
+    if filters.date_debut:
+        if not MONTH_START_RE.match(filters.date_debut):
+            return None
+        months["$gte"] = filters.date_debut[:7]
+    if filters.date_fin:
+        if not _last_day_of_month(filters.date_fin):
+            return None
+        months["$lte"] = filters.date_fin[:7]
+    if months:
+        match["_id.mois"] = months
+    return match
+
+def _avg(sum_field: str, n_field: str) -> Dict:
+    return {"$cond": [{"$gt": [n_field, 0]}, {"$divide": [sum_field, n_field]}, None]}
+
+def _metric_stages(outputs: List[tuple], sort: Dict) -> List[Dict]:
+    """Étapes regroupant les agrégats par catégorie : outputs = [(champ, opération, métrique)]"""
+    group = {"_id": "$_id.categorie"}
+    project = {}
+    for output, op, metric in outputs:
+        if op == "avg":
+            group[f"{output}__sum"] = {"$sum": f"${metric}_sum"}
+            group[f"{output}__n"] = {"$sum": f"${metric}_n"}
+            project[output] = _avg(f"${output}__sum", f"${output}__n")
+        else:
+            group[output] = {f"${op}": f"${metric}_{op}"}
+            project[output] = 1
+    group["count"] = {"$sum": "$count"}
+    project["count"] = 1
+    return [{"$group": group}, {"$project": project}, {"$sort": sort}]
+
+# Étapes de chaque statistique lues depuis le rollup (mêmes résultats que STAT_PIPELINES)
+ROLLUP_PIPELINES: Dict[str, List[Dict]] = {
+    "win-loss": [
+        {"$group": {"_id": "$_id.statut", "count": {"$sum": "$count"}}},
+        {"$sort": stat_sort("win-loss")}
+    ],
+    "win-loss-evolution-month": [
+        {"$addFields": {"mois": {"$ifNull": ["$_id.mois", ""]}}},
+        {
+            "$group": {
+                "_id": {
+                    "mois": "$mois",
+                    "annee": {"$substr": ["$mois", 0, 4]},
+                    "mois_num": {"$substr": ["$mois", 5, 2]},
+                    "statut": "$_id.statut"
+                },
+                "count": {"$sum": "$count"}
+            }
+        },
+        {"$sort": stat_sort("win-loss-evolution-month")}
+    ],
+    "success-rate-by-category": [
+        {
+            "$group": {
+                "_id": {"categorie": "$_id.categorie", "statut": "$_id.statut"},
+                "count": {"$sum": "$count"}
+            }
+        }
+    ] + STAT_PIPELINES["success-rate-by-category"][1:],
+    **{name: _metric_stages(outputs, stat_sort(name)) for name, outputs in METRIC_STATS.items()},
+}
+
+def build_rollup_pipeline(names: List[str], match: Dict) -> List[Dict]:
+    """Pipeline sur le rollup : une statistique directement, plusieurs via $facet"""
+    if len(names) == 1:
+        return [{"$match": match}] + ROLLUP_PIPELINES[names[0]]
+    return [
+        {"$match": match},
+        {"$facet": {name: ROLLUP_PIPELINES[name] + [{"$limit": STAT_RESULT_LIMIT}] for name in names}}
+    ]
+
+async def main(argv: List[str]):
+    """Commande : python -m api.server.stats.rollup rebuild"""
+    from dotenv import load_dotenv
+    from api.server.database.connection import db_manager
+
+    if argv[1:] != ["rebuild"]:
+        print("Usage: python -m api.server.stats.rollup rebuild")
+        return 1
+    load_dotenv(dotenv_path=".env")
+    await db_manager.connect()
+    try:
+        db = db_manager.get_database()
+        await rebuild_rollup(db)
+        count = await db[ROLLUP_COLLECTION].count_documents({})
+        print(f"✅ Rollup reconstruit: {count} agrégats")
+    finally:
+        await db_manager.disconnect()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(sys.argv)))
@@ -0,0 +1,110 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple, Union
+
+from api.server.stats.pipelines import (
+    STAT_RESULT_LIMIT,
+    build_stat_pipeline,
+    build_bundle_pipeline,
+    build_evolution_pipeline
+)
+from api.server.stats.cache import stats_cache, current_generation
+from api.server.stats.columnar import columnar_engine
+from api.server.stats.rollup import (
+    ROLLUP_COLLECTION,
+    rollup_state,
+    rollup_match,
+    build_rollup_pipeline
+)
+from api.server.database.migrations import typed_dates_state
+from api.server.utils.data_helpers import build_query_filters, patch_objectid
+
+DimensionFilter = Optional[Union[str, Tuple[str, ...]]]
+
+def _normalize_value(value):
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (list, tuple)):
+        values = tuple(sorted({v.strip() for v in value if isinstance(v, str) and v.strip()}))
+        if not values:
+            return None
+        return values[0] if len(values) == 1 else values
+    return value
+
+class StatsFilters(NamedTuple):
+    """Filtres communs à toutes les statistiques (plusieurs valeurs possibles par dimension)"""
+    categorie: DimensionFilter = None
+    statut: DimensionFilter = None
+    pole: DimensionFilter = None
+    date_debut: Optional[str] = None
+    date_fin: Optional[str] = None
+
+    def normalized(self) -> "StatsFilters":
+        """Filtres sans espaces superflus ni valeurs vides, valeurs multiples triées (clé de cache)"""
+        return StatsFilters(*(_normalize_value(value) for value in self))
+
+    def to_match(self, typed_dates: bool = False) -> Dict:
+        return build_query_filters(
+            self.categorie, self.statut, self.pole, self.date_debut, self.date_fin, typed_dates=typed_dates
+        )
+
+async def _aggregate(collection, pipeline: List[Dict], names: List[str]) -> Dict[str, List[Dict]]:
+    """Exécute un pipeline d'une statistique, ou de plusieurs regroupées par $facet"""
+    if len(names) == 1:
+        result = await collection.aggregate(pipeline).to_list(length=STAT_RESULT_LIMIT)
+        return {names[0]: patch_objectid(result)}
+
+    facets = await collection.aggregate(pipeline).to_list(length=1)
+    facets = facets[0] if facets else {}
+    return {name: patch_objectid(facets.get(name, [])) for name in names}
+
+async def compute_stats(db, names: List[str], filters: StatsFilters) -> Dict[str, List[Dict]]:
+    """Calcule une ou plusieurs statistiques, en servant depuis le cache ce qui peut l'être"""
+    filters = filters.normalized()
+    generation = current_generation()
+    results = {}
+    for name in names:
+        cached = stats_cache.get((generation, name, filters))
+        if cached is not None:
+            results[name] = cached
+    missing = [name for name in names if name not in results]
+    if missing:
+        computed = await _compute_uncached(db, missing, filters)
+        for name, rows in computed.items():
+            stats_cache.set((generation, name, filters), rows)
+        results.update(computed)
+    return {name: results[name] for name in names}
+
+async def _compute_uncached(db, names: List[str], filters: StatsFilters) -> Dict[str, List[Dict]]:
+    """Calcule une ou plusieurs statistiques ; plusieurs sont regroupées en une seule agrégation.
+
+    Ordre de préférence : moteur en colonnes (si activé et à jour), rollup mensuel
+    (si les filtres s'alignent sur des mois entiers), puis documents bruts.
+    """
+    if columnar_engine.usable():
+        return columnar_engine.compute(names, filters)
+
+    if rollup_state.ready:
+        match = rollup_match(filters)
+        if match is not None:
+            return await _aggregate(db.database[ROLLUP_COLLECTION], build_rollup_pipeline(names, match), names)
+
+    match = filters.to_match()
+    if len(names) == 1:
+        return await _aggregate(db, build_stat_pipeline(names[0], match), names)
+    return await _aggregate(db, build_bundle_pipeline(names, match), names)
+
+async def compute_stat(db, name: str, filters: StatsFilters) -> List[Dict]:
+    """Calcule une statistique"""
+    return (await compute_stats(db, [name], filters))[name]
+
+async def compute_evolution(db, filters: StatsFilters, granularity: str, timezone: str) -> List[Dict]:
+    """Évolution gagné/perdu par jour, semaine, mois, trimestre ou année dans un fuseau horaire"""
+    filters = filters.normalized()
+    key = (current_generation(), "win-loss-evolution", granularity, timezone, filters)
+    cached = stats_cache.get(key)
+    if cached is not None:
+        return cached
+    typed = typed_dates_state.ready
+    pipeline = build_evolution_pipeline(filters.to_match(typed_dates=typed), granularity, timezone, typed)
+    rows = await db.aggregate(pipeline).to_list(length=None)
+    stats_cache.set(key, rows)
+    return rows
@@ -0,0 +1,80 @@
+import asyncio
+from typing import Dict, List, Optional
+
+from api.server.stats.pipelines import STAT_NAMES
+from api.server.stats.service import StatsFilters, compute_stats
+from api.server.utils.data_helpers import clean_filtres
+
+# Clés des filtres enregistrés dans les tableaux de bord -> champ de StatsFilters
+DIMENSION_KEYS = {"categorie": "categorie", "statut": "statut", "pole": "pole"}
+DATE_KEYS = {"dateDebut": "date_debut", "date_debut": "date_debut", "dateFin": "date_fin", "date_fin": "date_fin"}
+
+def chart_stat(chart: Dict) -> Optional[str]:
+    """Statistique affichée par un graphique (None pour les widgets sans données, ex: sections)"""
+    chart_id = chart.get("chart_id")
+    return chart_id if chart_id in STAT_NAMES else None
+
+def _to_fields(filtres: Dict) -> Dict:
+    fields = {}
+    for key, value in clean_filtres(filtres).items():
+        if key in DIMENSION_KEYS and value:
+            fields[DIMENSION_KEYS[key]] = tuple(value)
+        elif key in DATE_KEYS and value:
+            fields[DATE_KEYS[key]] = value
+    return fields
+
+def merge_filters(filtres_globaux: Optional[Dict], filtres: Optional[Dict]) -> StatsFilters:
+    """Filtres d'un graphique : ceux du graphique l'emportent, dimension par dimension, sur les filtres globaux"""
+    fields = _to_fields(filtres_globaux or {})
+    fields.update(_to_fields(filtres or {}))
+    return StatsFilters(**fields).normalized()
+
+def _describe(filters: StatsFilters) -> Dict:
+    return {key: list(value) if isinstance(value, tuple) else value for key, value in filters._asdict().items() if value}
+
+async def resolve_dashboard_data(collection, dashboard: Dict) -> Dict:
+    """Données de tous les graphiques d'un tableau de bord.
+
+    Les requêtes identiques (même statistique, mêmes filtres) ne sont exécutées qu'une fois ;
+    les statistiques partageant les mêmes filtres sont calculées ensemble, et les groupes
+    de filtres distincts en parallèle.
+    """
+    charts = dashboard.get("graphiques", [])
+    filtres_globaux = dashboard.get("filtres_globaux")
+    resolved = [(chart, chart_stat(chart), merge_filters(filtres_globaux, chart.get("filtres"))) for chart in charts]
+
+    by_filters: Dict[StatsFilters, List[str]] = {}
+    for _, stat, filters in resolved:
+        if stat is not None and stat not in by_filters.setdefault(filters, []):
+            by_filters[filters].append(stat)
+    by_filters = {filters: names for filters, names in by_filters.items() if names}
+
+    groups = list(by_filters.items())
+    results = await asyncio.gather(
+        *(compute_stats(collection, names, filters) for filters, names in groups),
+        return_exceptions=True
+    )
+    data = dict(zip((filters for filters, _ in groups), results))
+
+    widgets = []
+    for chart, stat, filters in resolved:
+        widget = {
+            "instance_id": chart.get("instance_id"),
+            "chart_id": chart.get("chart_id"),
+            "stat": stat,
+            "filtres": _describe(filters),
+            "data": None,
+        }
+        if stat is not None:
+            result = data[filters]
+            if isinstance(result, Exception):
+                widget["error"] = str(result)
+            else:
+                widget["data"] = result[stat]
+        widgets.append(widget)
+
+    return {
+        "dashboard_id": str(dashboard["_id"]),
+        "widgets": widgets,
+        "queries": sum(len(names) for names in by_filters.values()),
+    }
@@ -1,5 +1,13 @@
-from typing import List, Dict, Union
-from datetime import datetime
+import base64
+import json
+import os
+from typing import List, Dict, Union, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from bson.raw_bson import RawBSONDocument
+
+from api.server.utils.json_response import decode_raw, dumps, mongo_date_to_iso
 
 def patch_objectid(result):
     """Convertit les ObjectId en string dans les résultats"""
@@ -16,12 +24,86 @@ def serialize_doc(doc):
             doc[k] = v.isoformat()
         # Gestion du format MongoDB Compass {"$date": ...}
         if isinstance(v, dict) and "$date" in v:
-            try:
-                doc[k] = datetime.fromtimestamp(v["$date"]/1000).isoformat()
-            except Exception:
-                doc[k] = str(v["$date"])
+            doc[k] = mongo_date_to_iso(v)
     return doc
 
+def parse_date(value) -> Optional[datetime]:
+    """Convertit une date (ISO, {"$date": ...} ou datetime) en datetime UTC naïf, None si invalide"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, dict) and "$date" in value:
+        raw = value["$date"]
+        if isinstance(raw, (int, float)):
+            return datetime.utcfromtimestamp(raw / 1000)
+        return parse_date(raw)
+    elif isinstance(value, str) and value.strip():
+        try:
+            parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+# Champs d'un appel d'offres sélectionnables via le paramètre `fields`
+TENDER_FIELDS = (
+    "nom_ao", "categorie", "pole", "statut", "date_emission", "date_reponse",
+    "prix_client", "prix_gagnant", "note_technique", "note_prix",
+    "score_client", "score_gagnant", "delai_jours",
+    "commentaires_ia", "raison_perte", "date_creation", "date_maj",
+    "date_emission_dt", "date_reponse_dt",
+    "ecart_prix", "ecart_score", "ratio_prix", "ratio_score"
+)
+# Champs texte volumineux exclus par défaut des listes
+TENDER_LARGE_FIELDS = ("commentaires_ia", "raison_perte")
+LIST_PROJECTION = {field: 0 for field in TENDER_LARGE_FIELDS}
+
+def build_projection(
+    fields: Optional[str],
+    default: Optional[Dict] = None,
+    required: Tuple[str, ...] = ()
+) -> Optional[Dict]:
+    """Convertit le paramètre `fields` (liste séparée par des virgules) en projection MongoDB.
+
+    `fields=*` renvoie le document complet ; sans `fields`, la projection par défaut
+    s'applique. Lève ValueError pour un champ inconnu.
+    """
+    if not fields:
+        return dict(default) if default else None
+    if fields.strip() == "*":
+        return None
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in names if name not in TENDER_FIELDS]
+    if unknown:
+        raise ValueError(f"Champs inconnus: {', '.join(unknown)}")
+    projection = {name: 1 for name in names}
+    for name in required:
+        projection[name] = 1
+    return projection
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+NDJSON_CHUNK_DOCS = 100
+
+def wants_ndjson(accept: Optional[str]) -> bool:
+    """Indique si le client demande un flux NDJSON via l'en-tête Accept"""
+    return bool(accept) and NDJSON_MEDIA_TYPE in accept
+
+async def iter_ndjson(cursor, chunk_docs: int = NDJSON_CHUNK_DOCS):
+    """Sérialise les documents d'un curseur Motor au fil de l'eau, une ligne JSON par document.
+
+    Les documents bruts (RawBSONDocument) sont décodés et sérialisés en un seul passage.
+    """
+    lines = []
+    async for doc in cursor:
+        lines.append(dumps(decode_raw(doc) if isinstance(doc, RawBSONDocument) else serialize_doc(doc)))
+        if len(lines) >= chunk_docs:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
 def clean_filtres(filtres):
     """Nettoie les filtres pour assurer la compatibilité"""
     if not filtres:
@@ -95,17 +177,25 @@ def build_query_filters(
     statut: str = None,
     pole: str = None,
     date_debut: str = None,
-    date_fin: str = None
+    date_fin: str = None,
+    typed_dates: bool = False
 ) -> Dict:
-    """Construit un dictionnaire de filtres pour les requêtes MongoDB"""
+    """Construit un dictionnaire de filtres pour les requêtes MongoDB.
+
+    categorie, statut et pole acceptent une liste de valeurs ($in).
+
+    Avec `typed_dates`, la plage porte sur date_emission_dt si les bornes sont des dates valides ;
+    les documents sans date typée (écrits hors API depuis la migration) restent filtrés
+    sur la chaîne date_emission.
+    """
     query = {}
     
-    if categorie:
-        query["categorie"] = categorie
-    if statut:
-        query["statut"] = statut
-    if pole:
-        query["pole"] = pole
+    for field, value in (("categorie", categorie), ("statut", statut), ("pole", pole)):
+        if isinstance(value, (list, tuple)):
+            if value:
+                query[field] = {"$in": list(value)}
+        elif value:
+            query[field] = value
     if date_debut or date_fin:
         date_query = {}
         if date_debut:
@@ -113,5 +203,54 @@ def build_query_filters(
         if date_fin:
             date_query["$lte"] = date_fin
         query["date_emission"] = date_query
+        if typed_dates:
+            bounds = {op: parse_date(value) for op, value in date_query.items()}
+            if all(bounds.values()):
+                del query["date_emission"]
+                query["$or"] = [
+                    {"date_emission_dt": bounds},
+                    {"date_emission_dt": None, "date_emission": date_query},
+                ]
     
-    return query 
\ No newline at end of file
+    return query 
+
+def encode_cursor(date_emission: Optional[str], last_id) -> str:
+    """Encode la position (date_emission, _id) du dernier document en jeton opaque"""
+    payload = json.dumps({"d": date_emission, "i": str(last_id)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(token: str) -> Tuple[Optional[str], ObjectId]:
+    """Décode un jeton de pagination, lève ValueError s'il est invalide"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return payload["d"], ObjectId(payload["i"])
+    except (ValueError, KeyError, TypeError, InvalidId) as e:
+        raise ValueError(f"Curseur invalide: {token}") from e
+
+def build_keyset_filter(date_emission: Optional[str], last_id: ObjectId) -> Dict:
+    """Filtre des documents situés après le curseur dans l'ordre (date_emission desc, _id desc)"""
+    if date_emission is None:
+        # Les documents sans date sont triés en dernier
+        return {"date_emission": None, "_id": {"$lt": last_id}}
+    return {
+        "$or": [
+            {"date_emission": {"$lt": date_emission}},
+            {"date_emission": date_emission, "_id": {"$lt": last_id}},
+            {"date_emission": None},
+        ]
+    }
+
+# Recouvrement des rafraîchissements incrémentaux : une écriture dont date_maj a été prise
+# avant le début du rafraîchissement précédent mais validée après (lot d'import en masse,
+# écriture lente) est relue au suivant
+SYNC_OVERLAP = timedelta(seconds=float(os.getenv("SYNC_OVERLAP_SECONDS", "30")))
+
+def modified_since(watermark: Optional[datetime]) -> Dict:
+    """Filtre des documents modifiés depuis `watermark` (début du parcours précédent), recouvrement compris.
+
+    Les documents relus sont identifiés par _id : les relire est sans effet.
+    """
+    if watermark is None:
+        return {"date_maj": {"$exists": True}}
+    return {"date_maj": {"$gte": watermark - SYNC_OVERLAP}}
@@ -0,0 +1,38 @@
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Response
+
+from api.server.utils.json_response import FastJSONResponse
+
+# Le navigateur garde la réponse mais la revalide à chaque fois (If-None-Match)
+CACHE_CONTROL = "private, no-cache"
+
+def make_etag(*parts: Any) -> str:
+    """ETag fort dérivé des éléments qui déterminent le contenu de la réponse"""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Vrai si l'en-tête If-None-Match désigne la version courante"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    # Comparaison faible (RFC 9110, If-None-Match) : on ignore le préfixe W/
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=etag_headers(etag))
+
+async def conditional_json(
+    if_none_match: Optional[str],
+    etag: str,
+    compute: Callable[[], Awaitable[Any]]
+) -> Response:
+    """304 sans calcul si le client a déjà cette version, sinon le JSON calculé avec son ETag"""
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return FastJSONResponse(content=await compute(), headers=etag_headers(etag))
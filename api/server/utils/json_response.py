@@ -0,0 +1,62 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+import orjson
+from bson import CodecOptions, Decimal128, ObjectId, decode, decode_all
+from bson.raw_bson import RawBSONDocument
+from fastapi.responses import JSONResponse
+
+# Documents bruts : le driver ne construit aucun dict Python à la lecture
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+def mongo_date_to_iso(value: Dict) -> str:
+    """Date au format MongoDB Compass {"$date": ...} en chaîne ISO"""
+    try:
+        return datetime.fromtimestamp(value["$date"] / 1000).isoformat()
+    except Exception:
+        return str(value["$date"])
+
+def _fix_mongo_dates(doc: Dict) -> Dict:
+    for key, value in doc.items():
+        if type(value) is dict and "$date" in value:
+            doc[key] = mongo_date_to_iso(value)
+    return doc
+
+def decode_raw(raw: RawBSONDocument) -> Dict:
+    """Décode un document brut ; ObjectId et datetime sont laissés à orjson"""
+    return _fix_mongo_dates(decode(raw.raw))
+
+def decode_raw_all(raws: List[RawBSONDocument]) -> List[Dict]:
+    """Décode une liste de documents bruts en un seul appel au décodeur C"""
+    return [_fix_mongo_dates(doc) for doc in decode_all(b"".join(raw.raw for raw in raws))]
+
+def raw_collection(collection):
+    """Même collection, lue en documents BSON bruts"""
+    return collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+
+def _default(obj: Any):
+    # orjson gère nativement dict, list, str, nombres et datetime ; le reste passe ici
+    if isinstance(obj, RawBSONDocument):
+        return decode_raw(obj)
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return float(obj.to_decimal())
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type non sérialisable en JSON: {type(obj).__name__}")
+
+def dumps(content: Any) -> bytes:
+    """Sérialise en JSON (UTF-8) avec orjson"""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+class FastJSONResponse(JSONResponse):
+    """Réponse JSON sérialisée par orjson.
+
+    orjson encode nativement les datetime ; ObjectId, Decimal128 et documents BSON
+    bruts (RawBSONDocument) sont convertis pendant la sérialisation, sans parcours
+    préalable du contenu. Les dates {"$date": ...} sont converties au décodage des
+    documents bruts (orjson n'appelle pas `default` pour les dict).
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
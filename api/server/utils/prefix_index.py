@@ -0,0 +1,248 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import os
+import re
+import sys
+import time
+import unicodedata
+from array import array
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from starlette.concurrency import run_in_threadpool
+
+from api.server.utils.data_helpers import modified_since
+
+TOKEN_RE = re.compile(r"\w+")
+# Nombre de documents modifiés au-delà duquel la partie incrémentale est recompactée
+OVERLAY_COMPACT_THRESHOLD = 5000
+
+def normalize_text(text: str) -> str:
+    """Met en minuscules et retire les accents"""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+def tokenize(text: str) -> List[str]:
+    """Découpe un texte normalisé en jetons"""
+    return TOKEN_RE.findall(normalize_text(text))
+
+class PrefixIndex:
+    """Index en mémoire des préfixes de jetons de `nom_ao` pour la saisie semi-automatique.
+
+    La partie compacte associe une liste triée de jetons à des tableaux d'entiers
+    (numéros de document triés, du plus récent au plus ancien). Les documents modifiés
+    depuis la dernière construction sont ajoutés dans une partie incrémentale, et leur
+    ancienne entrée est marquée comme supprimée.
+    """
+
+    def __init__(self):
+        self._tokens: List[str] = []
+        self._postings: List[array] = []
+        self._overlay: Dict[str, Set[int]] = {}
+        self._ids: List[Optional[str]] = []
+        self._names: List[Optional[str]] = []
+        self._slots: Dict[str, int] = {}
+        self._deleted: Set[int] = set()
+        self._base_size = 0
+        self._built_clock: Optional[float] = None
+        self.last_sync: Optional[datetime] = None
+        self.ready = False
+        self.build_seconds: Optional[float] = None
+        self.built_at: Optional[datetime] = None
+        self.refreshed_at: Optional[datetime] = None
+
+    # Construction
+
+    def _load(self, entries):
+        """Reconstruit toutes les structures à partir de couples (_id, nom_ao)"""
+        ids, names, slots = [], [], {}
+        postings: Dict[str, List[int]] = {}
+        for doc_id, name in entries:
+            slot = len(ids)
+            ids.append(doc_id)
+            names.append(name)
+            slots[doc_id] = slot
+            for token in set(tokenize(name)):
+                postings.setdefault(token, []).append(slot)
+
+        tokens = sorted(postings)
+        self._tokens = tokens
+        self._postings = [array("I", postings[token]) for token in tokens]
+        self._overlay = {}
+        self._ids, self._names, self._slots = ids, names, slots
+        self._deleted = set()
+        self._base_size = len(ids)
+
+    async def _load_async(self, entries):
+        """Construit les structures sur un index neuf dans le pool de threads, puis les adopte.
+
+        La construction (plusieurs secondes pour quelques centaines de milliers de noms)
+        ne bloque pas la boucle d'événements ; les recherches voient l'ancien index
+        jusqu'à l'échange, fait sans point d'attente.
+        """
+        fresh = PrefixIndex()
+        await run_in_threadpool(fresh._load, entries)
+        self._tokens, self._postings, self._overlay = fresh._tokens, fresh._postings, fresh._overlay
+        self._ids, self._names, self._slots = fresh._ids, fresh._names, fresh._slots
+        self._deleted, self._base_size = fresh._deleted, fresh._base_size
+
+    async def build(self, collection):
+        """Construit l'index complet depuis MongoDB (les plus récents d'abord)"""
+        start = time.perf_counter()
+        # Filigrane pris avant le parcours : un document modifié après le passage du curseur
+        # sera relu au prochain rafraîchissement
+        started_at = datetime.utcnow()
+        entries = []
+        cursor = collection.find({}, {"nom_ao": 1}).sort("date_emission", -1).batch_size(5000)
+        async for doc in cursor:
+            entries.append((str(doc["_id"]), doc.get("nom_ao") or ""))
+
+        await self._load_async(entries)
+        self.last_sync = started_at
+        self.ready = True
+        self.build_seconds = time.perf_counter() - start
+        self._built_clock = time.monotonic()
+        self.built_at = started_at
+        self.refreshed_at = started_at
+
+    async def refresh(self, collection) -> int:
+        """Intègre les documents modifiés depuis la dernière synchronisation (via date_maj)"""
+        if not self.ready:
+            await self.build(collection)
+            return len(self._ids)
+
+        started_at = datetime.utcnow()
+        count = 0
+        # Recouvrement relu à chaque fois : upsert ignore un nom inchangé
+        async for doc in collection.find(modified_since(self.last_sync), {"nom_ao": 1}):
+            self.upsert(str(doc["_id"]), doc.get("nom_ao") or "")
+            count += 1
+        self.last_sync = started_at
+
+        if len(self._ids) - self._base_size > OVERLAY_COMPACT_THRESHOLD:
+            await self.compact()
+        self.refreshed_at = datetime.utcnow()
+        return count
+
+    def upsert(self, doc_id: str, name: str):
+        """Ajoute ou remplace un document dans la partie incrémentale"""
+        old_slot = self._slots.get(doc_id)
+        if old_slot is not None:
+            if self._names[old_slot] == name:
+                return
+            self._deleted.add(old_slot)
+        slot = len(self._ids)
+        self._ids.append(doc_id)
+        self._names.append(name)
+        self._slots[doc_id] = slot
+        for token in set(tokenize(name)):
+            self._overlay.setdefault(token, set()).add(slot)
+
+    async def compact(self):
+        """Fusionne la partie incrémentale dans la partie compacte, sans relire MongoDB"""
+        live = sorted(self._slots.values())
+        # Les documents modifiés ont les numéros les plus grands : on les remet en tête
+        split = bisect.bisect_left(live, self._base_size)
+        ordered = list(reversed(live[split:])) + live[:split]
+        await self._load_async([(self._ids[slot], self._names[slot]) for slot in ordered])
+
+    def age_seconds(self) -> Optional[float]:
+        """Temps écoulé depuis la dernière construction complète"""
+        if self._built_clock is None:
+            return None
+        return time.monotonic() - self._built_clock
+
+    # Interrogation
+
+    def _prefix_range(self, prefix: str):
+        start = bisect.bisect_left(self._tokens, prefix)
+        end = bisect.bisect_left(self._tokens, prefix + "\uffff")
+        return start, end
+
+    def _candidates(self, prefix: str):
+        """Itère les numéros de documents ayant un jeton commençant par `prefix`, sans doublon"""
+        start, end = self._prefix_range(prefix)
+        overlay = sorted(
+            {slot for token, slots in self._overlay.items() if token.startswith(prefix) for slot in slots},
+            reverse=True
+        )
+        seen = set()
+        # Partie incrémentale d'abord (modifications les plus récentes), puis partie compacte
+        for slot in itertools.chain(overlay, heapq.merge(*self._postings[start:end])):
+            if slot not in seen:
+                seen.add(slot)
+                yield slot
+
+    def _volume(self, prefix: str) -> int:
+        start, end = self._prefix_range(prefix)
+        return sum(len(p) for p in self._postings[start:end])
+
+    def search(self, q: str, limit: int = 10) -> List[Dict]:
+        """Renvoie les documents dont chaque jeton de la requête préfixe un jeton du nom"""
+        terms = tokenize(q)
+        if not terms or not self.ready:
+            return []
+        driver = min(terms, key=self._volume)
+        others = [t for t in terms if t != driver]
+        results = []
+        for slot in self._candidates(driver):
+            if slot in self._deleted:
+                continue
+            name = self._names[slot]
+            if others:
+                name_tokens = tokenize(name)
+                if not all(any(tok.startswith(t) for tok in name_tokens) for t in others):
+                    continue
+            results.append({"_id": self._ids[slot], "nom_ao": name})
+            if len(results) >= limit:
+                break
+        return results
+
+    # Supervision
+
+    def memory_bytes(self) -> int:
+        """Estimation de l'empreinte mémoire de l'index"""
+        size = sys.getsizeof(self._tokens) + sum(sys.getsizeof(t) for t in self._tokens)
+        size += sys.getsizeof(self._postings) + sum(p.buffer_info()[1] * p.itemsize + 64 for p in self._postings)
+        size += sys.getsizeof(self._ids) + sum(sys.getsizeof(i) for i in self._ids)
+        size += sys.getsizeof(self._names) + sum(sys.getsizeof(n) for n in self._names)
+        size += sys.getsizeof(self._slots)
+        size += sum(sys.getsizeof(t) + sys.getsizeof(s) for t, s in self._overlay.items())
+        size += sys.getsizeof(self._deleted)
+        return size
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "documents": len(self._slots),
+            "tokens": len(self._tokens),
+            "overlay_tokens": len(self._overlay),
+            "deleted_slots": len(self._deleted),
+            "memory_bytes": self.memory_bytes(),
+            "build_seconds": self.build_seconds,
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "refreshed_at": self.refreshed_at.isoformat() if self.refreshed_at else None,
+            "last_sync": self.last_sync.isoformat() if self.last_sync else None,
+        }
+
+# Instance globale
+tender_name_index = PrefixIndex()
+
+async def maintain_prefix_index(get_collection):
+    """Tâche de fond : construction initiale, rafraîchissement incrémental et reconstruction périodique"""
+    refresh_seconds = float(os.getenv("SEARCH_INDEX_REFRESH_SECONDS", "30"))
+    rebuild_seconds = float(os.getenv("SEARCH_INDEX_REBUILD_SECONDS", "3600"))
+    while True:
+        try:
+            collection = await get_collection()
+            if not tender_name_index.ready or tender_name_index.age_seconds() > rebuild_seconds:
+                await tender_name_index.build(collection)
+            else:
+                await tender_name_index.refresh(collection)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Index de recherche non rafraîchi: {e}")
+        await asyncio.sleep(refresh_seconds)
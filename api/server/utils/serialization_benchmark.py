@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+from typing import Callable, List
+
+import bson
+from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
+
+from api.server.utils.data_helpers import patch_objectid, serialize_doc
+from api.server.utils.json_response import RAW_CODEC_OPTIONS, decode_raw_all, dumps
+
+def _sample_document(i: int) -> dict:
+    return {
+        "_id": ObjectId(),
+        "nom_ao": f"Appel d'offres n°{i} - maintenance des équipements réseau",
+        "categorie": "Infrastructure",
+        "pole": "Île-de-France",
+        "statut": "Gagné" if i % 2 else "Perdu",
+        "date_emission": "2024-03-15",
+        "date_reponse": "2024-04-02",
+        "prix_client": 125000.0 + i,
+        "prix_gagnant": 118000.0,
+        "note_technique": 15.5,
+        "note_prix": 12.0,
+        "score_client": 78.5,
+        "score_gagnant": 81.0,
+        "delai_jours": 18,
+        "ecart_prix": 7000.0 + i,
+        "ecart_score": -2.5,
+        "ratio_prix": 1.06,
+        "ratio_score": 0.97,
+        "date_creation": datetime(2024, 3, 15, 9, 30),
+        "date_maj": datetime(2024, 4, 2, 17, 5),
+    }
+
+def _legacy(raws: List[bytes]) -> bytes:
+    """Chemin initial : décodage en dict, serialize_doc, patch_objectid puis json de la bibliothèque standard"""
+    docs = [serialize_doc(bson.decode(raw)) for raw in raws]
+    return json.dumps(patch_objectid(docs), ensure_ascii=False).encode("utf-8")
+
+def _orjson_dicts(raws: List[bytes]) -> bytes:
+    """Décodage en dict puis orjson (ObjectId et datetime convertis à la sérialisation)"""
+    return dumps([bson.decode(raw) for raw in raws])
+
+def _raw_bson(raws: List[bytes]) -> bytes:
+    """Documents bruts décodés en un seul appel, puis orjson"""
+    return dumps(decode_raw_all([RawBSONDocument(raw, RAW_CODEC_OPTIONS) for raw in raws]))
+
+PATHS = [
+    ("serialize_doc + json", _legacy),
+    ("dict + orjson", _orjson_dicts),
+    ("RawBSONDocument + orjson", _raw_bson),
+]
+
+def _measure(path: Callable[[List[bytes]], bytes], raws: List[bytes], repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        path(raws)
+    return (time.perf_counter() - start) / (repeat * len(raws)) * 1e6
+
+async def _load_raws(limit: int) -> List[bytes]:
+    from dotenv import load_dotenv
+    from api.server.database.connection import db_manager
+
+    load_dotenv(dotenv_path=".env")
+    await db_manager.connect()
+    try:
+        collection = db_manager.get_collection("appels_offres").with_options(codec_options=RAW_CODEC_OPTIONS)
+        return [doc.raw async for doc in collection.find({}).limit(limit)]
+    finally:
+        await db_manager.disconnect()
+
+def main(argv: List[str]) -> int:
+    """Commande : python -m api.server.utils.serialization_benchmark [N] [--mongo]
+
+    Mesure le coût de sérialisation par document de chaque chemin, sur N documents
+    synthétiques ou sur les N premiers appels d'offres de la base avec --mongo.
+    """
+    args = [a for a in argv[1:] if not a.startswith("--")]
+    count = int(args[0]) if args else 10000
+    if "--mongo" in argv:
+        raws = asyncio.run(_load_raws(count))
+        source = "MongoDB"
+    else:
+        raws = [bson.encode(_sample_document(i)) for i in range(count)]
+        source = "synthétiques"
+    if not raws:
+        print("Aucun document")
+        return 1
+
+    # Les trois chemins doivent produire le même JSON
+    reference = json.loads(_legacy(raws))
+    for name, path in PATHS[1:]:
+        if json.loads(path(raws)) != reference:
+            print(f"⚠️ Résultat différent pour {name}")
+
+    repeat = max(1, 100000 // len(raws))
+    print(f"{len(raws)} documents {source}, {repeat} répétition(s)")
+    baseline = None
+    for name, path in PATHS:
+        cost = _measure(path, raws, repeat)
+        baseline = baseline or cost
+        print(f"{name:<28}{cost:>8.2f} µs/document{baseline / cost:>8.2f}x")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
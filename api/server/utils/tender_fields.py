@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from api.server.utils.data_helpers import parse_date
+
+# Champs dérivés stockés sur chaque appel d'offres, lus tels quels par les agrégations
+DERIVED_FIELDS = ("ecart_prix", "ecart_score", "ratio_prix", "ratio_score")
+# Valeurs sources de chaque champ dérivé
+DERIVED_INPUTS = {
+    "ecart_prix": ("prix_client", "prix_gagnant"),
+    "ecart_score": ("score_client", "score_gagnant"),
+    "ratio_prix": ("prix_client", "prix_gagnant"),
+    "ratio_score": ("score_client", "score_gagnant"),
+}
+# Champs date stockés en chaîne et leur équivalent typé (BSON date)
+TYPED_DATE_FIELDS = {"date_emission": "date_emission_dt", "date_reponse": "date_reponse_dt"}
+
+def _number(value) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+def _difference(a, b) -> Optional[float]:
+    a, b = _number(a), _number(b)
+    return a - b if a is not None and b is not None else None
+
+def _ratio(a, b) -> Optional[float]:
+    a, b = _number(a), _number(b)
+    return a / b if a is not None and b else None
+
+def derived_fields(doc: Dict) -> Dict:
+    """Écarts et ratios client / gagnant calculables (un champ dont une valeur manque est omis)"""
+    computed = {
+        "ecart_prix": _difference(doc.get("prix_client"), doc.get("prix_gagnant")),
+        "ecart_score": _difference(doc.get("score_client"), doc.get("score_gagnant")),
+        "ratio_prix": _ratio(doc.get("prix_client"), doc.get("prix_gagnant")),
+        "ratio_score": _ratio(doc.get("score_client"), doc.get("score_gagnant")),
+    }
+    return {field: value for field, value in computed.items() if value is not None}
+
+def missing_derived_fields(doc: Dict) -> Dict:
+    """Champs dérivés calculables et encore absents du document (complément sans écrasement)"""
+    return {field: value for field, value in derived_fields(doc).items() if doc.get(field) is None}
+
+def _derived_changes(doc: Dict, changed: Optional[Iterable[str]] = None) -> Tuple[Dict, List[str]]:
+    """Champs dérivés à écrire et à supprimer quand les valeurs sources `changed` changent (toutes si None).
+
+    Un champ dont une source change mais qui n'est plus calculable est supprimé :
+    l'ancienne valeur ne correspond plus aux sources.
+    """
+    computed = derived_fields(doc)
+    changed = None if changed is None else set(changed)
+    fields, unset = {}, []
+    for field, sources in DERIVED_INPUTS.items():
+        if changed is not None and not changed.intersection(sources):
+            continue
+        if field in computed:
+            fields[field] = computed[field]
+        else:
+            unset.append(field)
+    return fields, unset
+
+def typed_dates(doc: Dict) -> Dict:
+    """Champs date typés à enregistrer à côté des chaînes d'un appel d'offres"""
+    return {target: parse_date(doc.get(source)) for source, target in TYPED_DATE_FIELDS.items()}
+
+def prepare_tender(doc: Dict, now: Optional[datetime] = None) -> Tuple[Dict, List[str]]:
+    """Document prêt à être écrit (champs dérivés, dates typées et date_maj) et champs dérivés à supprimer"""
+    prepared = dict(doc)
+    fields, unset = _derived_changes(doc)
+    prepared.update(fields)
+    prepared.update(typed_dates(doc))
+    prepared["date_maj"] = now or datetime.utcnow()
+    return prepared, unset
+
+def prepare_tender_patch(
+    current: Dict, changes: Dict, now: Optional[datetime] = None
+) -> Tuple[Dict, List[str]]:
+    """Champs à écrire et à supprimer pour une modification partielle de `current`.
+
+    Seuls les champs dérivés dont une valeur source change sont recalculés, et seules
+    les dates typées des dates modifiées.
+    """
+    merged = {**current, **changes}
+    update = dict(changes)
+    fields, unset = _derived_changes(merged, changes)
+    update.update(fields)
+    for field, value in typed_dates(merged).items():
+        source = next(source for source, target in TYPED_DATE_FIELDS.items() if target == field)
+        if source in changes:
+            update[field] = value
+    update["date_maj"] = now or datetime.utcnow()
+    return update, unset
+
+def write_operators(fields: Dict, unset: List[str]) -> Dict:
+    """Opérateurs de mise à jour MongoDB ($unset seulement s'il y a des champs à supprimer)"""
+    operators = {"$set": fields}
+    if unset:
+        operators["$unset"] = {field: "" for field in unset}
+    return operators
+
+def after_write(before: Dict, fields: Dict, unset: List[str]) -> Dict:
+    """Document tel qu'il est après l'écriture de `fields` et la suppression de `unset`"""
+    after = {**before, **fields}
+    for field in unset:
+        after.pop(field, None)
+    return after
@@ -45,8 +45,11 @@ export class AuthService {
   }
 
   // Changer le mot de passe
+  // Les tokens précédents sont révoqués : le nouveau token renvoyé remplace celui en cours
   async changePassword(request: ChangePasswordRequest): Promise<{ message: string }> {
-    return apiService.patch<{ message: string }>('/users/me/password', request);
+    const data = await apiService.patch<{ message: string; access_token: string }>('/users/me/password', request);
+    localStorage.setItem('access_token', data.access_token);
+    return { message: data.message };
   }
 
   // Vérifier si l'utilisateur est connecté
@@ -1,5 +1,5 @@
 import apiService from './api';
-import { Dashboard, DashboardCreate, Chart, LayoutItem } from '../types/dashboard';
+import { Dashboard, DashboardCreate, DashboardData, DashboardOp, Chart, LayoutItem } from '../types/dashboard';
 
 export class DashboardService {
   // Récupérer tous les tableaux de bord de l'utilisateur
@@ -12,6 +12,16 @@ export class DashboardService {
     return apiService.get<Dashboard>(`/dashboards/${id}`);
   }
 
+  // Données de tous les graphiques d'un tableau de bord en une requête
+  async getDashboardData(id: string): Promise<DashboardData> {
+    return apiService.get<DashboardData>(`/dashboards/${id}/data`);
+  }
+
+  // Télécharger le rapport PDF d'un tableau de bord
+  async exportPdf(id: string): Promise<void> {
+    return apiService.downloadFile(`/dashboards/${id}/export/pdf`, `tableau_de_bord_${id}.pdf`);
+  }
+
   // Créer un nouveau tableau de bord
   async createDashboard(dashboard: DashboardCreate): Promise<Dashboard> {
     return apiService.post<Dashboard>('/dashboards', dashboard);
@@ -88,6 +98,11 @@ export class DashboardService {
     });
   }
 
+  // Appliquer une suite d'opérations en une seule écriture (version connue du tableau de bord, 409 si elle a changé)
+  async applyOps(dashboardId: string, ops: DashboardOp[], version?: number): Promise<Dashboard> {
+    return apiService.post<Dashboard>(`/dashboards/${dashboardId}/ops`, { ops, version });
+  }
+
   // Mettre à jour la disposition des graphiques
   async updateLayout(
     dashboardId: string, 
@@ -1,19 +1,34 @@
 import apiService from './api';
-import { Tender, TenderCreate, TenderFilters, TenderStats, TenderSearchResult } from '../types/tender';
+import {
+  Tender,
+  TenderCreate,
+  TenderFilters,
+  TenderPageParams,
+  TenderStats,
+  TenderSearchResult,
+  PaginatedResponse,
+  ExportJob,
+  BulkImportReport
+} from '../types/tender';
 
 export class TenderService {
-  // Récupérer tous les appels d'offres
-  async getTenders(filters?: TenderFilters): Promise<Tender[]> {
+  // Récupérer une page d'appels d'offres (passer `after: page.next_cursor` pour la suivante)
+  async getTenders(filters?: TenderFilters, page?: TenderPageParams): Promise<PaginatedResponse<Tender>> {
     const params = new URLSearchParams();
     if (filters) {
       Object.entries(filters).forEach(([key, value]) => {
         if (value) params.append(key, value);
       });
     }
+    if (page) {
+      Object.entries(page).forEach(([key, value]) => {
+        if (value !== undefined && value !== null) params.append(key, String(value));
+      });
+    }
     
     const queryString = params.toString();
     const endpoint = queryString ? `/tenders?${queryString}` : '/tenders';
-    return apiService.get<Tender[]>(endpoint);
+    return apiService.get<PaginatedResponse<Tender>>(endpoint);
   }
 
   // Récupérer un appel d'offres par ID
@@ -26,6 +41,11 @@ export class TenderService {
     return apiService.post<Tender>('/tenders', tender);
   }
 
+  // Import en masse (CSV, Excel ou NDJSON) ; les lignes existantes (nom_ao, date_emission) sont mises à jour
+  async bulkImport(file: File): Promise<BulkImportReport> {
+    return apiService.uploadFile<BulkImportReport>('/tenders/bulk', file);
+  }
+
   // Mettre à jour un appel d'offres
   async updateTender(id: string, tender: Partial<Tender>): Promise<Tender> {
     return apiService.patch<Tender>(`/tenders/${id}`, tender);
@@ -134,6 +154,54 @@ export class TenderService {
     return apiService.get<any[]>(endpoint);
   }
 
+  // Plusieurs statistiques en une seule requête (toutes si `include` est vide)
+  async getStatsBundle(include?: string[], filters?: TenderFilters): Promise<Record<string, any[]>> {
+    const params = new URLSearchParams();
+    if (include && include.length) params.append('include', include.join(','));
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+
+    const queryString = params.toString();
+    const endpoint = queryString ? `/tenders/stats/bundle?${queryString}` : '/tenders/stats/bundle';
+    return apiService.get<Record<string, any[]>>(endpoint);
+  }
+
+  // Distribution d'un champ numérique (box plot, histogramme)
+  async getDistribution(
+    field: string,
+    options?: { bins?: number; quantiles?: number[]; group_by?: string },
+    filters?: TenderFilters
+  ): Promise<{ field: string; group_by?: string | null; groups: any[] }> {
+    const params = new URLSearchParams({ field });
+    if (options?.bins) params.append('bins', String(options.bins));
+    if (options?.quantiles?.length) params.append('quantiles', options.quantiles.join(','));
+    if (options?.group_by) params.append('group_by', options.group_by);
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+    return apiService.get(`/tenders/stats/distribution?${params.toString()}`);
+  }
+
+  // Évolution gagné/perdu par période (day, week, month, quarter, year)
+  async getWinLossEvolution(
+    granularity: 'day' | 'week' | 'month' | 'quarter' | 'year' = 'month',
+    timezone: string = 'UTC',
+    filters?: TenderFilters
+  ): Promise<{ _id: { periode: string | null; statut: string }; count: number }[]> {
+    const params = new URLSearchParams({ granularity, timezone });
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+    return apiService.get(`/tenders/stats/win-loss-evolution?${params.toString()}`);
+  }
+
   // Options de filtres
   async getFilterOptions(): Promise<{
     categories: string[];
@@ -148,6 +216,22 @@ export class TenderService {
     return apiService.get<TenderSearchResult[]>(`/tenders/search?q=${encodeURIComponent(query)}`);
   }
 
+  // Recherche plein texte classée par pertinence
+  async fullTextSearch(
+    query: string,
+    filters?: TenderFilters,
+    page: number = 1,
+    size: number = 50
+  ): Promise<PaginatedResponse<Tender>> {
+    const params = new URLSearchParams({ q: query, mode: 'text', page: String(page), size: String(size) });
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+    return apiService.get<PaginatedResponse<Tender>>(`/tenders/search?${params.toString()}`);
+  }
+
   // Export Excel
   async exportExcel(filters?: TenderFilters): Promise<void> {
     const params = new URLSearchParams();
@@ -162,6 +246,43 @@ export class TenderService {
     return apiService.downloadFile(endpoint, 'appels_offres.xlsx');
   }
 
+  // Export en colonnes typées (Parquet ou Arrow IPC), sans limite de lignes
+  async exportColumnar(format: 'parquet' | 'arrow', filters?: TenderFilters): Promise<void> {
+    const params = new URLSearchParams();
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+
+    const queryString = params.toString();
+    const endpoint = queryString ? `/tenders/export/${format}?${queryString}` : `/tenders/export/${format}`;
+    return apiService.downloadFile(endpoint, `appels_offres.${format}`);
+  }
+
+  // Export en arrière-plan : renvoie le travail à suivre avec getExportJob
+  async startExportJob(format: ExportJob['format'], filters?: TenderFilters): Promise<ExportJob> {
+    const params = new URLSearchParams({ format });
+    if (filters) {
+      Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+      });
+    }
+    return apiService.post<ExportJob>(`/tenders/export/jobs?${params.toString()}`);
+  }
+
+  async getExportJob(id: string): Promise<ExportJob> {
+    return apiService.get<ExportJob>(`/jobs/${id}`);
+  }
+
+  async downloadExportJob(job: ExportJob): Promise<void> {
+    return apiService.downloadFile(`/jobs/${job.id}/download`, job.filename);
+  }
+
+  async deleteExportJob(id: string): Promise<{ message: string }> {
+    return apiService.delete<{ message: string }>(`/jobs/${id}`);
+  }
+
   // Gestion des favoris
   async addToFavorites(tenderId: string): Promise<{ message: string }> {
     return apiService.post<{ message: string }>(`/tenders/favorites/${tenderId}`);
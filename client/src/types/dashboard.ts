@@ -22,6 +22,8 @@ export interface Dashboard {
   user_id: string;
   date_creation?: string;
   date_maj?: string;
+  // Incrémentée à chaque modification (à renvoyer avec les opérations groupées)
+  version?: number;
 }
 
 export interface DashboardCreate {
@@ -30,6 +32,21 @@ export interface DashboardCreate {
   filtres_globaux?: Record<string, any>;
 }
 
+export interface WidgetData {
+  instance_id?: string;
+  chart_id: string;
+  stat: string | null;
+  filtres: Record<string, string | string[]>;
+  data: any[] | null;
+  error?: string;
+}
+
+export interface DashboardData {
+  dashboard_id: string;
+  widgets: WidgetData[];
+  queries: number;
+}
+
 export interface LayoutItem {
   instance_id: string;
   x: number;
@@ -38,6 +55,15 @@ export interface LayoutItem {
   h: number;
 }
 
+export type DashboardOp =
+  | { op: 'move'; instance_id: string; x: number; y: number }
+  | { op: 'resize'; instance_id: string; w: number; h: number }
+  | { op: 'retitle'; instance_id: string; customTitle: string }
+  | { op: 'refilter'; instance_id: string; filtres: Record<string, any> }
+  | { op: 'retext'; instance_id: string; text: string }
+  | { op: 'add'; chart: Chart }
+  | { op: 'remove'; instance_id: string };
+
 export interface ChartType {
   id: string;
   name: string;
@@ -15,6 +15,11 @@ export interface Tender {
   delai_jours?: number;
   commentaires_ia?: string;
   raison_perte?: string;
+  // Champs dérivés calculés par l'API à l'écriture
+  ecart_prix?: number | null;
+  ecart_score?: number | null;
+  ratio_prix?: number | null;
+  ratio_score?: number | null;
   date_creation?: string;
   date_maj?: string;
 }
@@ -53,7 +58,50 @@ export interface TenderStats {
   taux_succes: number;
 }
 
+export interface TenderPageParams {
+  limit?: number;
+  after?: string;
+  with_total?: boolean;
+  fields?: string;
+}
+
+export interface PaginatedResponse<T> {
+  items: T[];
+  size: number;
+  next_cursor?: string | null;
+  total?: number | null;
+  page?: number | null;
+  pages?: number | null;
+}
+
 export interface TenderSearchResult {
   id: string;
   nom_ao: string;
-} 
\ No newline at end of file
+}
+
+export interface ExportJob {
+  id: string;
+  format: 'xlsx' | 'parquet' | 'arrow';
+  status: 'pending' | 'running' | 'done' | 'failed' | 'cancelled';
+  rows: number;
+  total: number | null;
+  progress: number | null;
+  bytes: number;
+  error: string | null;
+  created_at: number;
+  started_at: number | null;
+  finished_at: number | null;
+  expires_at: number | null;
+  filename: string;
+}
+
+export interface BulkImportReport {
+  rows: number;
+  inserted: number;
+  updated: number;
+  duplicates: number;
+  invalid: number;
+  errors: { line: number; errors: string[] }[];
+  errors_truncated: boolean;
+  aborted: string | null;
+}